@@ -0,0 +1,133 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from jwks import JWKSKeyStore, cache_max_age
+
+
+def make_key(kid):
+    return {'kty': 'RSA', 'kid': kid, 'use': 'sig', 'n': 'n-' + kid,
+            'e': 'AQAB', 'x5c': ['ignored']}
+
+
+class JWKSHandler(BaseHTTPRequestHandler):
+    """Serves the stand-in server's current key set"""
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        if server.status != 200:
+            self.send_error(server.status)
+            return
+        body = json.dumps({'keys': server.keys}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if server.cache_control:
+            self.send_header('Cache-Control', server.cache_control)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class JWKSKeyStoreTestCase(unittest.TestCase):
+    """This class represents the JWKS key store test case"""
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), JWKSHandler)
+        self.server.requests = 0
+        self.server.status = 200
+        self.server.keys = [make_key('first'), make_key('second')]
+        self.server.cache_control = 'public, max-age=120'
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{}/.well-known/jwks.json'.format(
+            self.server.server_port)
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def store(self, **kwargs):
+        store = JWKSKeyStore(self.url, **kwargs)
+        self.stores.append(store)
+        return store
+
+    def test_keys_indexed_by_kid_and_fetched_once(self):
+        store = self.store()
+
+        self.assertEqual(store.get_key('second'), {
+            'kty': 'RSA', 'kid': 'second', 'use': 'sig', 'n': 'n-second',
+            'e': 'AQAB'})
+        self.assertEqual(store.get_key('first')['n'], 'n-first')
+        self.assertEqual(self.server.requests, 1)
+
+    def test_cache_control_max_age(self):
+        store = self.store(background=False)
+        store.get_key('first')
+
+        self.assertEqual(store.expires_at - store.fetched_at, 120)
+
+    def test_unknown_kid_refetches_once(self):
+        now = [0]
+        store = self.store(background=False, min_refetch_interval=30,
+                           clock=lambda: now[0])
+        store.get_key('first')
+        self.server.keys = [make_key('rotated')]
+
+        now[0] = 10
+        self.assertIsNone(store.get_key('rotated'))
+        self.assertEqual(self.server.requests, 1)
+
+        now[0] = 40
+        self.assertEqual(store.get_key('rotated')['kid'], 'rotated')
+        self.assertIsNone(store.get_key('unknown'))
+        self.assertIsNone(store.get_key('unknown'))
+        self.assertEqual(self.server.requests, 2)
+
+    def test_background_refresh(self):
+        self.server.cache_control = 'max-age=1'
+        store = self.store(refresh_margin=0, min_refetch_interval=0.05)
+        store.get_key('first')
+        self.server.keys = [make_key('rotated')]
+
+        deadline = time.monotonic() + 5
+        while self.server.requests < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertGreaterEqual(self.server.requests, 2)
+        # served from the refreshed cache, no request on the hot path
+        requests = self.server.requests
+        self.assertEqual(store.get_key('rotated')['kid'], 'rotated')
+        self.assertLessEqual(self.server.requests, requests + 1)
+
+    def test_failed_refresh_keeps_stale_keys(self):
+        now = [0]
+        store = self.store(background=False, min_refetch_interval=0,
+                           clock=lambda: now[0])
+        store.get_key('first')
+        self.server.status = 503
+
+        with self.assertRaises(Exception):
+            store.fetch()
+        self.assertIsNone(store.get_key('unknown'))
+        self.assertEqual(store.get_key('first')['kid'], 'first')
+        self.assertEqual(self.server.requests, 3)
+
+    def test_cache_max_age_parsing(self):
+        self.assertEqual(cache_max_age('public, max-age=86400'), 86400)
+        self.assertEqual(cache_max_age('s-maxage=5, max-age="60"'), 60)
+        self.assertEqual(cache_max_age('no-store'), 0)
+        self.assertEqual(cache_max_age(None, default=7), 7)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,12 @@
-from flask import Flask, request, jsonify, abort
+import os
+
+from flask import Flask, Response, request, jsonify, abort
+
+from greetings import make_store
 
 app = Flask(__name__)
 
-greetings = {
+default_greetings = {
             'en': 'hello', 
             'es': 'Hola', 
             'ar': 'مرحبا',
@@ -12,22 +16,28 @@ greetings = {
             'ja': 'こんにちは'
             }
 
+# set GREETINGS_DATABASE to a SQLite file to share greetings between workers
+greetings = make_store(os.environ.get('GREETINGS_DATABASE'), default_greetings)
+
+def greetings_response():
+    return Response(greetings.all_json(), mimetype='application/json')
+
 @app.route('/greeting', methods=['GET'])
 def greeting_all():
-    return jsonify({'greetings': greetings})
+    return greetings_response()
 
 @app.route('/greeting/<lang>', methods=['GET'])
 def greeting_one(lang):
     print(lang)
-    if(lang not in greetings):
+    greeting = greetings.get(lang)
+    if(greeting is None):
         abort(404)
-    return jsonify({'greeting': greetings[lang
-    ]})
+    return jsonify({'greeting': greeting})
 
 @app.route('/greeting', methods=['POST'])
 def greeting_add():
     info = request.get_json()
     if('lang' not in info or 'greeting' not in info):
         abort(422)
-    greetings[info['lang']] = info['greeting']
-    return jsonify({'greetings':greetings})
+    greetings.set(info['lang'], info['greeting'])
+    return greetings_response()
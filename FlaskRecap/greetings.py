@@ -0,0 +1,127 @@
+import json
+import sqlite3
+import threading
+
+
+class GreetingStore:
+    """Greetings keyed by language code
+
+    Subclasses implement get(), all(), set() and version(); the version
+    must change whenever any greeting does. all_json() keeps the
+    serialized {'greetings': ...} body and rebuilds it only after a change.
+    """
+
+    def __init__(self):
+        self._body_lock = threading.Lock()
+        self._body = (None, None)
+
+    def all_json(self):
+        version, body = self._body
+        current = self.version()
+        if version == current:
+            return body
+        with self._body_lock:
+            # another thread may have rebuilt the body while we waited
+            version, body = self._body
+            current = self.version()
+            if version == current:
+                return body
+            # the version is read before the greetings; if a write lands
+            # while we serialize, the stored version is already stale
+            greetings = self.all()
+            body = json.dumps({'greetings': greetings}, sort_keys=True).encode()
+            self._body = (current, body)
+        return body
+
+
+class MemoryGreetingStore(GreetingStore):
+    """A lock-protected dict; every worker process has its own copy"""
+
+    def __init__(self, greetings=None):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._greetings = dict(greetings or {})
+        self._version = 0
+
+    def get(self, lang):
+        return self._greetings.get(lang)
+
+    def all(self):
+        with self._lock:
+            return dict(self._greetings)
+
+    def set(self, lang, greeting):
+        with self._lock:
+            self._greetings[lang] = greeting
+            self._version += 1
+
+    def version(self):
+        return self._version
+
+
+class SQLiteGreetingStore(GreetingStore):
+    """Greetings in a SQLite file shared by every worker process
+
+    A one-row counter is incremented in the same transaction as each
+    write, so a worker learns about other workers' writes with a single
+    primary key read. The request threads of a worker share one
+    connection, opened once and used under a lock.
+    """
+
+    def __init__(self, path, greetings=None):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, timeout=5, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute('PRAGMA synchronous = NORMAL')
+        with self._lock, self._connection as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS greetings '
+                '(lang TEXT PRIMARY KEY, greeting TEXT NOT NULL)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS greetings_version '
+                '(id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER NOT NULL)')
+            connection.execute(
+                'INSERT OR IGNORE INTO greetings_version VALUES (0, 0)')
+            if greetings:
+                inserted = connection.executemany(
+                    'INSERT OR IGNORE INTO greetings VALUES (?, ?)',
+                    greetings.items()).rowcount
+                if inserted:
+                    self._bump(connection)
+
+    def _bump(self, connection):
+        connection.execute(
+            'UPDATE greetings_version SET version = version + 1 WHERE id = 0')
+
+    def get(self, lang):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT greeting FROM greetings WHERE lang = ?', (lang,)).fetchone()
+        return row[0] if row else None
+
+    def all(self):
+        with self._lock:
+            return dict(self._connection.execute(
+                'SELECT lang, greeting FROM greetings'))
+
+    def set(self, lang, greeting):
+        with self._lock, self._connection as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO greetings VALUES (?, ?)',
+                (lang, greeting))
+            self._bump(connection)
+
+    def version(self):
+        with self._lock:
+            return self._connection.execute(
+                'SELECT version FROM greetings_version WHERE id = 0').fetchone()[0]
+
+
+def make_store(database=None, greetings=None):
+    """A SQLiteGreetingStore on `database`, or a MemoryGreetingStore"""
+    if database:
+        return SQLiteGreetingStore(database, greetings)
+    return MemoryGreetingStore(greetings)
@@ -0,0 +1,117 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from greetings import MemoryGreetingStore, SQLiteGreetingStore
+
+GREETINGS = {'en': 'Hello', 'es': 'Hola'}
+
+
+class GreetingStoreTests:
+    """Tests every store must pass; mixed into a TestCase per store"""
+
+    def test_get_and_set(self):
+        self.assertEqual(self.store.get('en'), 'Hello')
+        self.assertIsNone(self.store.get('fr'))
+
+        self.store.set('fr', 'Bonjour')
+
+        self.assertEqual(self.store.get('fr'), 'Bonjour')
+
+    def test_all_json_follows_writes(self):
+        before = json.loads(self.store.all_json())
+        self.store.set('fr', 'Bonjour')
+        after = json.loads(self.store.all_json())
+
+        self.assertEqual(before, {'greetings': GREETINGS})
+        self.assertEqual(after, {'greetings': dict(GREETINGS, fr='Bonjour')})
+
+    def test_concurrent_writers(self):
+        def write(worker):
+            for i in range(20):
+                self.store.set('{}-{}'.format(worker, i), 'greeting')
+                self.store.all_json()
+
+        threads = [threading.Thread(target=write, args=(worker,))
+                   for worker in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        greetings = json.loads(self.store.all_json())['greetings']
+        self.assertEqual(len(greetings), len(GREETINGS) + 8 * 20)
+        self.assertEqual(greetings, self.store.all())
+
+    def test_body_is_rebuilt_once_per_write(self):
+        self.store.all_json()
+        self.store.set('fr', 'Bonjour')
+        all_greetings = self.store.all
+        calls = []
+
+        def slow_all():
+            calls.append(1)
+            # keep the lock long enough for every reader to queue on it
+            time.sleep(0.05)
+            return all_greetings()
+
+        with mock.patch.object(self.store, 'all', side_effect=slow_all):
+            threads = [threading.Thread(target=self.store.all_json)
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(calls), 1)
+
+
+class MemoryGreetingStoreTestCase(GreetingStoreTests, unittest.TestCase):
+    """This class represents the in-memory greeting store test case"""
+
+    def setUp(self):
+        self.store = MemoryGreetingStore(GREETINGS)
+
+
+class SQLiteGreetingStoreTestCase(GreetingStoreTests, unittest.TestCase):
+    """This class represents the SQLite greeting store test case"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'greetings.db')
+        self.store = SQLiteGreetingStore(self.path, GREETINGS)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_other_workers_see_writes(self):
+        other = SQLiteGreetingStore(self.path, GREETINGS)
+        other.all_json()
+
+        self.store.set('fr', 'Bonjour')
+
+        self.assertEqual(other.get('fr'), 'Bonjour')
+        self.assertIn('fr', json.loads(other.all_json())['greetings'])
+
+    def test_threads_share_one_connection(self):
+        with mock.patch('greetings.sqlite3.connect',
+                        wraps=sqlite3.connect) as connect:
+            store = SQLiteGreetingStore(self.path)
+            threads = [threading.Thread(target=store.get, args=('en',))
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(connect.call_count, 1)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
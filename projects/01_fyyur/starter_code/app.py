@@ -3,9 +3,7 @@
 #----------------------------------------------------------------------------#
 
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, stream_with_context
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 import logging
@@ -13,7 +11,14 @@ from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
-from models import db, Venue, Artist, Show, Genre
+from filters import format_datetime
+from fragments import FragmentCache, render_cached
+from instrumentation import SQLInstrumentation
+from models import (db, Venue, Artist, Show, Genre, get_or_create_genres,
+  refresh_upcoming_show_counts, refresh_artist_letters, ARTIST_LETTERS)
+from queries import (venue_areas, search_by_name, detail_page, show_listing,
+  parse_show_cursor, artist_letters,
+  artist_directory, parse_artist_cursor)
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -22,6 +27,7 @@ app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
 db.init_app(app)
+SQLInstrumentation(app)
 
 migrate = Migrate(app, db)
 
@@ -31,16 +37,40 @@ migrate = Migrate(app, db)
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
-
 app.jinja_env.filters['datetime'] = format_datetime
 
+# rendered artist and venue pages, keyed by id and page_version
+page_fragments = FragmentCache(
+  app.config['FRAGMENT_CACHE_SIZE'], app.config['FRAGMENT_CACHE_DIR'])
+
+def stream_template(template_name, **context):
+  # renders a template chunk by chunk so the response can start before
+  # the whole context (e.g. a lazy query result) has been consumed
+  app.update_template_context(context)
+  template = app.jinja_env.get_template(template_name)
+  return template.stream(context)
+
+def detail_response(model, entity_id, template_name, name):
+  # a primary key lookup of the page version is all a cached page costs;
+  # the split into past and upcoming shows expires with the next show
+  version = db.session.query(model.page_version) \
+    .filter(model.id == entity_id).scalar()
+  if version is None:
+    abort(404)
+
+  def build():
+    data = detail_page(model, entity_id)
+    if data is None:
+      return None, None
+    upcoming = data['upcoming_shows']
+    return {name: data}, upcoming[0]['start_time'] if upcoming else None
+
+  key = '{}-{}-{}'.format(model.__tablename__, entity_id, version)
+  page = render_cached(page_fragments, key, template_name, build)
+  if page is None:
+    abort(404)
+  return page
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -53,83 +83,19 @@ def index():
 
 @app.route('/venues')
 def venues():
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  data = []
-  venues = Venue.query.all()
-  for venue in venues:
-    num_shows = db.session.query(Show).filter_by(venue_id = venue.id).filter(
-          Show.start_time > datetime.utcnow().isoformat()).all()
-    result = {"city": venue.city, "state": venue.state, "venues": []}
-    result["venues"].append({
-      "id": venue.id,
-      "name": venue.name,
-      "num_upcoming_shows": len(num_shows)
-    })
-    data.append(result)
-  return render_template('pages/venues.html', areas=data)
+  return render_template('pages/venues.html', areas=venue_areas())
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for Hop should return "The Musical Hop".
-  # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  data = []
-  searchParam = request.form.get("search_term")
-  venues = db.session.query(Venue).with_entities(Venue.id, Venue.name).filter(Venue.name.contains(searchParam)).all()
-  for venue in venues:
-    num_shows = db.session.query(Show).filter_by(venue_id = venue.id).filter(
-      Show.start_time > datetime.utcnow().isoformat()).all()
-      
-    data.append({
-      "id": venue.id,
-      "name": venue.name,
-      "num_upcoming_shows": len(num_shows)
-    })
-  response={
-    "count": len(venues),
-    "data": data
-  }
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  search_term = request.form.get('search_term', '')
+  page = request.form.get('page', 1, type=int)
+  response = search_by_name(Venue, search_term, page)
+  return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-  venue = db.session.query(Venue).filter_by(id = venue_id).first()
-  if venue:
-    data = venue.__dict__
-
-  shows = db.session.query(Show).filter_by(venue_id = venue.id).filter(
-      Show.start_time < datetime.utcnow().isoformat()).all()
-  past_shows = []
-  for show in shows:
-    venue = show.venue
-    past_shows.append({
-      "venue_id": venue.id,
-      "venue_name": venue.name,
-      "venue_image_link": venue.image_link,
-      "start_time": format_datetime(str(show.start_time))
-    })
-
-  new_shows = db.session.query(Show).filter_by(venue_id = venue.id).filter(
-      Show.start_time > datetime.utcnow().isoformat()).all()
-  upcoming_shows = []
-  for show in new_shows:
-    venue = show.venue
-    upcoming_shows.append({
-      "venue_id": venue.id,
-      "venue_name": venue.name,
-      "venue_image_link": venue.image_link,
-      "start_time": format_datetime(str(show.start_time))
-    })
-  data["past_shows"] = past_shows
-  data["upcoming_shows"] = upcoming_shows
-  data["past_shows_count"] = len(past_shows)
-  data["upcoming_shows_count"] = len(upcoming_shows)
-
-
-  return render_template('pages/show_venue.html', venue=data)
+  return detail_response(Venue, venue_id, 'pages/show_venue.html', 'venue')
   
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -144,13 +110,7 @@ def create_venue_submission():
   form = VenueForm()
   new_venue = Venue()
   try:
-    venue_genres = request.form.getlist('genres')
-    genres = []
-    for genre in venue_genres:
-      new_genre = Genre(name=genre)
-      db.session.add(new_genre)
-      db.session.commit()
-      genres.append(new_genre)
+    genres = get_or_create_genres(request.form.getlist('genres'))
 
     new_venue.name = request.form.get('name', '')
     new_venue.city = request.form.get('city', '')
@@ -173,6 +133,7 @@ def create_venue_submission():
   # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
   except Exception as error:
+    db.session.rollback()
     flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')
     return render_template('pages/home.html')
 
@@ -198,77 +159,26 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
-  # TODO: replace with real data returned from querying the database
-  data = db.session.query(Artist).with_entities(Artist.id, Artist.name).all()
-  return render_template('pages/artists.html', artists=data)
+  # one keyset page of the artist directory, with the A-Z index
+  letter = request.args.get('letter', '').upper()
+  directory = artist_directory(
+    after=parse_artist_cursor(request.args.get('after')),
+    before=parse_artist_cursor(request.args.get('before')),
+    letter=letter if letter in ARTIST_LETTERS[1:] else None)
+  return render_template('pages/artists.html', letters=artist_letters(), **directory)
 
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-  # search for "band" should return "The Wild Sax Band".
-
-  data = []
-  artists = []
-
-  searchTerm = request.form.get("search_term").lower()
-  for artist in db.session.query(Artist).with_entities(Artist.id, Artist.name).all():
-    if searchTerm in artist.name.lower():
-      artists.append(artist)
-
-  for artist in artists:
-    upcoming_shows = db.session.query(Show).filter_by(artist_id = artist.id).filter(
-      Show.start_time > datetime.utcnow().isoformat()).all()
-    data.append({
-      "id": artist.id,
-      "name": artist.name,
-      "num_upcoming_shows": len(upcoming_shows)
-    })
-  response={
-    "count": len(artists),
-    "data": data
-  }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  search_term = request.form.get('search_term', '')
+  page = request.form.get('page', 1, type=int)
+  response = search_by_name(Artist, search_term, page)
+  return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
-  # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-
-  artist = db.session.query(Artist).filter_by(id = artist_id).first()
-  if artist:
-    data = artist.__dict__
-
-  shows = db.session.query(Show).filter_by(artist_id = artist.id).filter(
-      Show.start_time < datetime.utcnow().isoformat()).all()
-  past_shows = []
-  for show in shows:
-    venue = show.venue
-    past_shows.append({
-      "venue_id": venue.id,
-      "venue_name": venue.name,
-      "venue_image_link": venue.image_link,
-      "start_time": format_datetime(str(show.start_time))
-    })
-
-  new_shows = db.session.query(Show).filter_by(artist_id = artist.id).filter(
-      Show.start_time > datetime.utcnow().isoformat()).all()
-  upcoming_shows = []
-  for show in new_shows:
-    venue = show.venue
-    upcoming_shows.append({
-      "venue_id": venue.id,
-      "venue_name": venue.name,
-      "venue_image_link": venue.image_link,
-      "start_time": format_datetime(str(show.start_time))
-    })
-  data["past_shows"] = past_shows
-  data["upcoming_shows"] = upcoming_shows
-  data["past_shows_count"] = len(past_shows)
-  data["upcoming_shows_count"] = len(upcoming_shows)
-
-  return render_template('pages/show_artist.html', artist=data)
+  # shows the artist page with the given artist_id
+  return detail_response(Artist, artist_id, 'pages/show_artist.html', 'artist')
 
 #  Update
 #  ----------------------------------------------------------------
@@ -301,9 +211,7 @@ def edit_artist_submission(artist_id):
   artist = db.session.query(Artist).filter_by(id = artist_id).first()
   form = ArtistEditForm()
   try:
-    genres = []
-    for genre in request.form.getlist("genres"):
-      genres.append(Genre(name=genre))
+    genres = get_or_create_genres(request.form.getlist("genres"))
 
     artist.name = request.form.get("name")
     artist.city = city
@@ -320,6 +228,7 @@ def edit_artist_submission(artist_id):
     db.session.commit()
     flash('Artist ' + request.form['name'] + ' was successfully updated!')
   except Exception as err:
+    db.session.rollback()
     flash('An error occurred. Artist ' + request.form['name'] + ' could not be updated.')
 
   return redirect(url_for('show_artist', artist_id=artist_id))
@@ -358,10 +267,11 @@ def edit_venue_submission(venue_id):
       venue.city = form.city.data
       venue.state = form.state.data
       venue.phone = form.phone.data
-      venue.genres = form.genres.data
+      venue.genres = get_or_create_genres(form.genres.data)
       venue.facebook_link = form.facebook_link.data
       db.session.commit()
   except Exception as err:
+    db.session.rollback()
     flash('An error occurred. Venue ' + request.form['name'] + ' could not be updated.')
 
   return redirect(url_for('show_venue', venue_id=venue_id))
@@ -389,14 +299,7 @@ def create_artist_submission():
     artist.state = request.form.get('state', '')
     artist.facebook_link = request.form.get('facebook_link', '')
 
-    select_genre = request.form.getlist('genres')
-    genres = []
-    for genre in select_genre:
-      artist_genre = Genre(name=genre)
-      db.session.add(artist_genre)
-      db.session.commit()
-      genres.append(artist_genre)
-    artist.genres = genres
+    artist.genres = get_or_create_genres(request.form.getlist('genres'))
 
     db.session.add(artist)
     db.session.commit()
@@ -406,6 +309,7 @@ def create_artist_submission():
   # e.g., flash('An error occurred. Artist ' + data.name + ' could not be listed.')
     flash('Artist ' + request.form['name'] + ' was successfully listed!')
   except Exception as error:
+    db.session.rollback()
     flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
   return render_template('pages/home.html')
 
@@ -415,23 +319,10 @@ def create_artist_submission():
 
 @app.route('/shows')
 def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  data = []
-  shows = db.session.query(Show).all()
-  
-  for show in shows:
-    show_list = {}
-    show_list["venue_id"] = show.venue_id
-    show_list["venue_name"] = show.venue.name
-    show_list["artist_id"] = show.artist_id
-    show_list["artist_name"] = show.artist.name
-    show_list["artist_image_link"] = show.artist.image_link
-    show_list["start_time"] = show.start_time
-    data.append(show_list)
-    
-  return render_template('pages/shows.html', shows=data)
+  # displays list of shows at /shows, one keyset page at a time
+  after = parse_show_cursor(request.args.get('after'))
+  return Response(stream_with_context(stream_template('pages/shows.html',
+    shows=show_listing(after))))
 
 
 @app.route('/shows/create')
@@ -464,6 +355,18 @@ def create_show_submission():
     flash('An error occurred. Show could not be listed.')
   return render_template('pages/home.html')
 
+#  Commands
+#  ----------------------------------------------------------------
+
+@app.cli.command('refresh-counters')
+def refresh_counters():
+  """Recount upcoming shows so shows that have started count as past,
+  and the artists per letter of the /artists index."""
+  with db.engine.begin() as connection:
+    refresh_upcoming_show_counts(connection)
+    refresh_artist_letters(connection)
+  print('Upcoming show and artist letter counters refreshed.')
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
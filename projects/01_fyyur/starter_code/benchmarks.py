@@ -0,0 +1,60 @@
+#----------------------------------------------------------------------------#
+# Micro-benchmarks.
+#
+#   python benchmarks.py
+#----------------------------------------------------------------------------#
+
+import random
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from filters import format_datetime
+
+
+def legacy_format_datetime(value, format='medium'):
+  # the `datetime` filter as it was before filters.py: reparse the string
+  # and let babel rebuild the pattern on every call
+  date = dateutil.parser.parse(value)
+  if format == 'full':
+      format="EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE MM, dd, y h:mma"
+  return babel.dates.format_datetime(date, format)
+
+
+def timed(function, values, format):
+  start = time.perf_counter()
+  for value in values:
+    function(value, format)
+  return time.perf_counter() - start
+
+
+def bench_datetime_filter(n=100000, distinct=1000, seed=0):
+  '''
+  Formats `n` show times with the legacy and the current filter. Pages
+  render the same shows many times, so the timestamps are drawn from a
+  pool of `distinct` values; a run over all-distinct values shows the
+  cost without the memo.
+  '''
+  rng = random.Random(seed)
+  epoch = datetime(2019, 1, 1)
+  pool = [epoch + timedelta(minutes=rng.randrange(10 ** 6)) for _ in range(distinct)]
+  repeated = [rng.choice(pool) for _ in range(n)]
+  unique = [epoch + timedelta(minutes=i) for i in range(n)]
+
+  results = []
+  for label, values in (('repeated', repeated), ('distinct', unique)):
+    legacy = timed(legacy_format_datetime, [str(value) for value in values], 'full')
+    format_datetime.cache_clear()
+    current = timed(format_datetime, values, 'full')
+    results.append((label, legacy, current))
+  return results
+
+
+if __name__ == '__main__':
+  for label, legacy, current in bench_datetime_filter():
+    print('datetime filter, 100k {:<9} legacy {:7.3f}s  current {:7.3f}s  speedup {:5.1f}x'.format(
+      label, legacy, current, legacy / current))
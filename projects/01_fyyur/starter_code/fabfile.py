@@ -1,6 +1,13 @@
+import os
+
 from fabric.api import local, settings, abort
 from fabric.contrib.console import confirm
 
+# defaults for perf_check(); override with e.g. `PERF_LATENCY_THRESHOLD=0.5 fab deploy`
+PERF_LATENCY_THRESHOLD = os.environ.get("PERF_LATENCY_THRESHOLD", "0.25")
+PERF_MIN_LATENCY_MS = os.environ.get("PERF_MIN_LATENCY_MS", "1.0")
+PERF_QUERY_THRESHOLD = os.environ.get("PERF_QUERY_THRESHOLD", "0")
+
 # prepare for deployment
 
 
@@ -13,9 +20,27 @@ def test():
         abort("Aborted at user request.")
 
 
+def perf_check(latency_threshold=PERF_LATENCY_THRESHOLD,
+               min_latency_ms=PERF_MIN_LATENCY_MS,
+               query_threshold=PERF_QUERY_THRESHOLD):
+    with settings(warn_only=True):
+        result = local(
+            "python perf_check.py --latency-threshold {} --min-latency-ms {}"
+            " --query-threshold {}".format(
+                latency_threshold, min_latency_ms, query_threshold)
+        )
+    if result.failed:
+        abort("Performance check failed; see the table above.")
+
+
+def perf_baseline():
+    local("python perf_check.py --update-baseline")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
-    local("git add . && git commit -am '{}'".format(message))
+    # a baseline perf_check() recorded on its own is committed by hand
+    local("git add -- . ':!perf_baseline.json' && git commit -m '{}'".format(message))
 
 
 def push():
@@ -24,6 +49,7 @@ def push():
 
 def prepare():
     test()
+    perf_check()
     commit()
     push()
 
@@ -47,6 +73,7 @@ def heroku_test():
 def deploy():
     pull()
     test()
+    perf_check()
     commit()
     heroku()
     heroku_test()
@@ -0,0 +1,36 @@
+#----------------------------------------------------------------------------#
+# Jinja filters.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from functools import lru_cache
+
+import babel.dates
+import dateutil.parser
+from babel import Locale
+
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+@lru_cache(maxsize=None)
+def compiled_datetime_format(format, locale):
+  '''
+  Parses a babel pattern (or one of the DATETIME_FORMATS names) and its
+  locale once; the result is reused by every later call.
+  '''
+  pattern = DATETIME_FORMATS.get(format, format)
+  return babel.dates.parse_pattern(pattern), Locale.parse(locale)
+
+@lru_cache(maxsize=4096)
+def format_datetime(value, format='medium', locale=None):
+  '''
+  Formats a datetime (or a string dateutil can parse) with a precompiled
+  babel pattern. Recently formatted values are memoized, which pays off
+  on pages that render the same show times over and over.
+  '''
+  if not isinstance(value, datetime):
+    value = dateutil.parser.parse(value)
+  pattern, locale = compiled_datetime_format(format, locale or babel.dates.LC_TIME)
+  return pattern.apply(value, locale)
@@ -0,0 +1,132 @@
+#----------------------------------------------------------------------------#
+# Rendered page fragment cache.
+#----------------------------------------------------------------------------#
+
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import current_app, render_template
+from markupsafe import Markup
+
+class FragmentCache:
+  '''
+  Rendered template blocks by key, in a bounded in-process LRU and, when
+  `directory` is given, in files there too, so that worker processes share
+  entries and they survive restarts. Keys should include a version that
+  changes with the data the blocks were rendered from; an entry may also
+  carry an `expires` time (naive UTC) after which it is ignored.
+  '''
+  def __init__(self, maxsize=1024, directory=None):
+    self.maxsize = maxsize
+    self.directory = directory
+    self._lock = threading.Lock()
+    self._entries = OrderedDict()
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+
+  def get(self, key, now=None):
+    now = now or datetime.utcnow()
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None:
+        self._entries.move_to_end(key)
+    if entry is None and self.directory:
+      entry = self._read(key)
+      if entry is not None:
+        self._remember(key, entry)
+    if entry is None:
+      return None
+    blocks, expires = entry
+    if expires is not None and now >= expires:
+      return None
+    return blocks
+
+  def set(self, key, blocks, expires=None):
+    entry = ({name: Markup(html) for name, html in blocks.items()}, expires)
+    self._remember(key, entry)
+    if self.directory:
+      self._write(key, entry)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+    if self.directory:
+      for name in os.listdir(self.directory):
+        if name.endswith('.json'):
+          os.remove(os.path.join(self.directory, name))
+
+  def _remember(self, key, entry):
+    with self._lock:
+      self._entries[key] = entry
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.maxsize:
+        self._entries.popitem(last=False)
+
+  def _path(self, key):
+    return os.path.join(self.directory, key + '.json')
+
+  def _read(self, key):
+    path = self._path(key)
+    try:
+      with open(path) as file:
+        stored = json.load(file)
+      # the file's mtime is its last use, see _write()
+      os.utime(path)
+    except (OSError, ValueError):
+      return None
+    expires = stored['expires'] and datetime.fromisoformat(stored['expires'])
+    return {name: Markup(html) for name, html in stored['blocks'].items()}, expires
+
+  def _write(self, key, entry):
+    blocks, expires = entry
+    temporary = '{}.{}.tmp'.format(self._path(key), uuid.uuid4().hex)
+    with open(temporary, 'w') as file:
+      json.dump({
+        'blocks': {name: str(html) for name, html in blocks.items()},
+        'expires': expires and expires.isoformat(),
+      }, file)
+    os.replace(temporary, self._path(key))
+    files = [os.path.join(self.directory, name)
+      for name in os.listdir(self.directory) if name.endswith('.json')]
+    if len(files) > self.maxsize:
+      files.sort(key=lambda path: os.stat(path).st_mtime_ns)
+      for path in files[:len(files) - self.maxsize]:
+        try:
+          os.remove(path)
+        except FileNotFoundError:
+          pass
+
+def render_blocks(template_name, blocks, **context):
+  '''
+  Renders only the named blocks of a template, without the layout it
+  extends: {block name: Markup}.
+  '''
+  current_app.update_template_context(context)
+  template = current_app.jinja_env.get_template(template_name)
+  template_context = template.new_context(context)
+  return {name: Markup(''.join(template.blocks[name](template_context)))
+    for name in blocks}
+
+def render_cached(cache, key, template_name, build):
+  '''
+  Renders `template_name` with its title and content blocks taken from
+  `cache` under `key`. On a miss, `build()` returns the template context
+  and the time the blocks expire (or None); it may return (None, None)
+  when there is nothing to render, and so does render_cached().
+
+  The blocks go into layouts/fragment.html, so the layout itself (the
+  flashed messages and the active navigation item) is rendered fresh on
+  every request.
+  '''
+  blocks = cache.get(key)
+  if blocks is None:
+    context, expires = build()
+    if context is None:
+      return None
+    blocks = render_blocks(template_name, ('title', 'content'), **context)
+    cache.set(key, blocks, expires)
+  return render_template('layouts/fragment.html', fragments=blocks)
@@ -0,0 +1,122 @@
+#----------------------------------------------------------------------------#
+# Per-request SQL instrumentation.
+#----------------------------------------------------------------------------#
+
+import re
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from time import perf_counter
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\?")
+PLACEHOLDER_LIST = re.compile(r"\(\?(?:\s*,\s*\?)+\)")
+WHITESPACE = re.compile(r"\s+")
+
+# QueryStats objects collecting queries outside of a request, see record_queries()
+_recorders = []
+
+@lru_cache(maxsize=1024)
+def statement_template(statement):
+  '''
+  The shape of a SQL statement: literals and bound parameters become `?`
+  and IN lists collapse to one `(?...)`, so the queries an N+1 loop issues
+  for different ids all share one template.
+  '''
+  template = LITERAL.sub('?', statement)
+  template = PLACEHOLDER.sub('?', template)
+  template = PLACEHOLDER_LIST.sub('(?...)', template)
+  return WHITESPACE.sub(' ', template).strip()
+
+class QueryStats:
+  '''
+  Queries run while handling one request: how many, their total time in
+  seconds and how often each statement template came up.
+  '''
+  def __init__(self):
+    self.count = 0
+    self.duration = 0.0
+    self.templates = Counter()
+
+  def add(self, statement, duration):
+    self.count += 1
+    self.duration += duration
+    self.templates[statement_template(statement)] += 1
+
+  def repeated(self, threshold):
+    return [(template, count) for template, count in self.templates.most_common()
+            if count > threshold]
+
+@contextmanager
+def record_queries():
+  '''
+  Collects every query run inside the block, on any engine, into the
+  QueryStats it yields. Meant for tests and benchmarks.
+  '''
+  stats = QueryStats()
+  _recorders.append(stats)
+  try:
+    yield stats
+  finally:
+    _recorders.remove(stats)
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  conn.info['query_started'] = perf_counter()
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  duration = perf_counter() - conn.info.pop('query_started', perf_counter())
+  for stats in _recorders:
+    stats.add(statement, duration)
+  if has_app_context() and 'db_stats' in g:
+    g.db_stats.add(statement, duration)
+
+class SQLInstrumentation:
+  '''
+  Counts and times the queries of every request.
+
+  With SQL_TIMING_HEADERS set, responses carry `X-DB-Queries` and a
+  `Server-Timing: db` entry. Streamed responses run most of their queries
+  after the headers are sent, so those headers only cover the queries made
+  before streaming started. When one statement template runs more than
+  SQL_REPEATED_QUERY_THRESHOLD times in a request, a warning naming the
+  route and the statement is logged once the request has finished.
+  '''
+  def __init__(self, app=None):
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('SQL_TIMING_HEADERS', app.debug)
+    app.config.setdefault('SQL_REPEATED_QUERY_THRESHOLD', 10)
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+      event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+      event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+    app.before_request(self.start_request)
+    app.after_request(self.add_timing_headers)
+    app.teardown_request(self.report_repeated_queries)
+
+  def start_request(self):
+    g.db_stats = QueryStats()
+
+  def add_timing_headers(self, response):
+    stats = g.get('db_stats')
+    if stats is not None and current_app.config['SQL_TIMING_HEADERS']:
+      response.headers['X-DB-Queries'] = str(stats.count)
+      response.headers.add('Server-Timing', 'db;dur={:.1f};desc="{} queries"'.format(
+        stats.duration * 1000, stats.count))
+    return response
+
+  def report_repeated_queries(self, error=None):
+    stats = g.pop('db_stats', None)
+    if stats is None:
+      return
+    threshold = current_app.config['SQL_REPEATED_QUERY_THRESHOLD']
+    for template, count in stats.repeated(threshold):
+      current_app.logger.warning(
+        'Possible N+1: %s %s ran the same statement %d times (%d queries, %.1f ms): %s',
+        request.method, request.path, count, stats.count, stats.duration * 1000,
+        template)
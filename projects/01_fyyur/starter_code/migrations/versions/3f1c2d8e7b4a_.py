@@ -0,0 +1,40 @@
+"""trigram indexes for artist and venue name search
+
+Revision ID: 3f1c2d8e7b4a
+Revises: 9a4238fac315
+Create Date: 2026-10-18 09:12:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2d8e7b4a'
+down_revision = '9a4238fac315'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # a plain btree index cannot serve ILIKE '%term%', so other databases
+    # get no index rather than one misleadingly named *_trgm
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_artist_name_trgm', 'artist', ['name'],
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_venue_name_trgm', 'venue', ['name'],
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        # databases upgraded before the indexes became PostgreSQL-only
+        op.execute('DROP INDEX IF EXISTS ix_venue_name_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_artist_name_trgm')
+        return
+    op.drop_index('ix_venue_name_trgm', table_name='venue')
+    op.drop_index('ix_artist_name_trgm', table_name='artist')
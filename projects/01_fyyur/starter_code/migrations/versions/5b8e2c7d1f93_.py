@@ -0,0 +1,45 @@
+"""artist directory: lower(name) index and per-letter artist counts
+
+Revision ID: 5b8e2c7d1f93
+Revises: c2d7f4a91e65
+Create Date: 2026-10-18 19:41:05.583320
+
+"""
+import string
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2c7d1f93'
+down_revision = 'c2d7f4a91e65'
+branch_labels = None
+depends_on = None
+
+LETTERS = ['#'] + list(string.ascii_uppercase)
+
+
+def upgrade():
+    op.create_index('ix_artist_lower_name_id', 'artist',
+                    [sa.text('lower(name)'), 'id'])
+    artist_letter = op.create_table('artist_letter',
+        sa.Column('letter', sa.String(length=1), nullable=False),
+        sa.Column('artist_count', sa.Integer(), nullable=False,
+                  server_default='0'),
+        sa.PrimaryKeyConstraint('letter')
+    )
+    op.bulk_insert(artist_letter,
+                   [{'letter': letter, 'artist_count': 0} for letter in LETTERS])
+    op.execute(
+        "UPDATE artist_letter SET artist_count = ("
+        " SELECT COUNT(*) FROM artist"
+        " WHERE CASE WHEN upper(substr(artist.name, 1, 1)) IN ({})"
+        " THEN upper(substr(artist.name, 1, 1)) ELSE '#' END"
+        " = artist_letter.letter)"
+        .format(', '.join("'{}'".format(letter) for letter in LETTERS[1:])))
+
+
+def downgrade():
+    op.drop_table('artist_letter')
+    op.drop_index('ix_artist_lower_name_id', table_name='artist')
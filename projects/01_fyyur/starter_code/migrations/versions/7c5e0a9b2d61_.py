@@ -0,0 +1,24 @@
+"""index shows by (start_time, id) for keyset pagination
+
+Revision ID: 7c5e0a9b2d61
+Revises: 3f1c2d8e7b4a
+Create Date: 2026-10-18 11:47:03.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c5e0a9b2d61'
+down_revision = '3f1c2d8e7b4a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_start_time_id', 'show', ['start_time', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_show_start_time_id', table_name='show')
@@ -0,0 +1,46 @@
+"""merge duplicate genres and make genre.name unique
+
+Revision ID: b81e4f6a0c37
+Revises: 7c5e0a9b2d61
+Create Date: 2026-10-18 14:05:26.331870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81e4f6a0c37'
+down_revision = '7c5e0a9b2d61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for table, owner in (('venue_genre', 'venue_id'), ('artist_genres', 'artist_id')):
+        # point every link at the oldest genre with the same name
+        op.execute(
+            'UPDATE {table} SET genre_id = ('
+            ' SELECT MIN(keep.id) FROM genre dup'
+            ' JOIN genre keep ON keep.name = dup.name'
+            ' WHERE dup.id = {table}.genre_id)'.format(table=table))
+        # and drop the links that became duplicates
+        if postgres:
+            op.execute(
+                'DELETE FROM {table} a USING {table} b'
+                ' WHERE a.ctid > b.ctid AND a.{owner} = b.{owner}'
+                ' AND a.genre_id = b.genre_id'.format(table=table, owner=owner))
+        else:
+            op.execute(
+                'DELETE FROM {table} WHERE rowid NOT IN ('
+                ' SELECT MIN(rowid) FROM {table} GROUP BY {owner}, genre_id)'
+                .format(table=table, owner=owner))
+    op.execute(
+        'DELETE FROM genre WHERE id NOT IN ('
+        ' SELECT MIN(id) FROM genre GROUP BY name)')
+    op.create_index('uq_genre_name', 'genre', ['name'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_genre_name', table_name='genre')
@@ -0,0 +1,28 @@
+"""page versions keying the cached venue and artist pages
+
+Revision ID: c2d7f4a91e65
+Revises: e4a93c1f58d2
+Create Date: 2026-10-18 18:04:37.216094
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d7f4a91e65'
+down_revision = 'e4a93c1f58d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venue', sa.Column('page_version', sa.Integer(),
+                                     nullable=False, server_default='0'))
+    op.add_column('artist', sa.Column('page_version', sa.Integer(),
+                                      nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('artist', 'page_version')
+    op.drop_column('venue', 'page_version')
@@ -0,0 +1,39 @@
+"""denormalized upcoming show counters on venue and artist
+
+Revision ID: e4a93c1f58d2
+Revises: b81e4f6a0c37
+Create Date: 2026-10-18 16:22:10.745519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a93c1f58d2'
+down_revision = 'b81e4f6a0c37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venue', sa.Column('upcoming_show_count', sa.Integer(),
+                                     nullable=False, server_default='0'))
+    op.add_column('artist', sa.Column('upcoming_show_count', sa.Integer(),
+                                      nullable=False, server_default='0'))
+    if op.get_bind().dialect.name == 'postgresql':
+        now = "(now() AT TIME ZONE 'utc')"
+    else:
+        now = 'CURRENT_TIMESTAMP'
+    for table, owner in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        op.execute(
+            'UPDATE {table} SET upcoming_show_count = ('
+            ' SELECT COUNT(*) FROM show'
+            ' WHERE show.{owner} = {table}.id'
+            ' AND show.start_time > {now})'
+            .format(table=table, owner=owner, now=now))
+
+
+def downgrade():
+    op.drop_column('artist', 'upcoming_show_count')
+    op.drop_column('venue', 'upcoming_show_count')
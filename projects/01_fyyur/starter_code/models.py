@@ -1,7 +1,16 @@
+import string
+from datetime import datetime
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import case, event, func, inspect, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
 
 db = SQLAlchemy()
 
+# Process-local genre name -> id cache, see get_or_create_genres().
+genre_ids = {}
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
@@ -12,9 +21,84 @@ class Genre(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
 
+    __table_args__ = (
+      db.Index('uq_genre_name', 'name', unique=True),
+    )
+
     def __repr__(self):
       return self.name
 
+def get_or_create_genres(names):
+    '''
+    Returns the Genre rows for `names`, inserting the missing ones inside the
+    current transaction. Unknown names are resolved in one round trip
+    (INSERT ... ON CONFLICT ... RETURNING on PostgreSQL) and then served
+    from the genre_ids cache, so the caller commits once for the entity and
+    all of its genres. Ids found here only reach genre_ids once the session
+    commits; until then they are kept in the session's own pending map.
+    '''
+    pending = db.session.info.setdefault('pending_genre_ids', {})
+    names = list(dict.fromkeys(name for name in names if name))
+    missing = [name for name in names
+               if name not in genre_ids and name not in pending]
+    if missing:
+        rows = [{'name': name} for name in missing]
+        if db.engine.dialect.name == 'postgresql':
+            insert = postgresql.insert(Genre.__table__).values(rows)
+            insert = insert.on_conflict_do_update(
+                index_elements=['name'], set_={'name': insert.excluded.name}
+            ).returning(Genre.id, Genre.name)
+            found = db.session.execute(insert).fetchall()
+        else:
+            db.session.execute(
+                Genre.__table__.insert().prefix_with('OR IGNORE'), rows)
+            found = db.session.execute(
+                select([Genre.id, Genre.name]).where(Genre.name.in_(missing))
+            ).fetchall()
+        pending.update((name, genre_id) for genre_id, name in found)
+
+    genres = []
+    for name in names:
+        genre = Genre(id=pending.get(name, genre_ids.get(name)), name=name)
+        make_transient_to_detached(genre)
+        genres.append(db.session.merge(genre, load=False))
+    return genres
+
+@event.listens_for(Session, 'after_commit')
+def _publish_genre_ids(session):
+    # only committed rows are safe to hand to other requests
+    genre_ids.update(session.info.pop('pending_genre_ids', {}))
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_genre_ids(session, previous_transaction):
+    # ids resolved in a rolled back transaction (or savepoint) may no longer
+    # exist, and a cached id may be what made the transaction fail
+    session.info.pop('pending_genre_ids', None)
+    genre_ids.clear()
+
+@event.listens_for(Session, 'after_transaction_end')
+def _drop_unpublished_genre_ids(session, transaction):
+    # a session closed without committing never publishes its ids
+    if transaction.parent is None:
+        session.info.pop('pending_genre_ids', None)
+
+def _forget_genre_ids(target):
+    genre_ids.clear()
+    session = object_session(target)
+    if session is not None:
+        session.info.pop('pending_genre_ids', None)
+
+@event.listens_for(Genre, 'after_update')
+def _invalidate_renamed_genre_id(mapper, connection, target):
+    # appending an artist or venue to a genre's backref also flushes the
+    # genre as updated; only a new name makes a cached id wrong
+    if inspect(target).attrs.name.history.has_changes():
+        _forget_genre_ids(target)
+
+@event.listens_for(Genre, 'after_delete')
+def _invalidate_genre_id(mapper, connection, target):
+    _forget_genre_ids(target)
+
 venue_genre = db.Table('venue_genre',
     db.Column('venue_id', db.Integer, db.ForeignKey('venue.id')),
     db.Column('genre_id', db.Integer, db.ForeignKey('genre.id'))
@@ -36,8 +120,19 @@ class Venue(db.Model):
     website = db.Column(db.String(500))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0,
+      server_default='0')
+    # bumped whenever the venue page would render differently, see
+    # bump_page_versions(); keys the page's cached fragment in app.py
+    page_version = db.Column(db.Integer, nullable=False, default=0,
+      server_default='0')
     shows = db.relationship('Show', backref='venue', lazy=True)
 
+    __table_args__ = (
+      db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin',
+        postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
+
     def __repr__(self):
       return f'<Venue ID: {self.id}, Venue: {self.name}>'
 
@@ -62,11 +157,80 @@ class Artist(db.Model):
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(500))
     seeking_venue = db.Column(db.Boolean, nullable=False, default=False)
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0,
+      server_default='0')
+    page_version = db.Column(db.Integer, nullable=False, default=0,
+      server_default='0')
     shows = db.relationship('Show', backref='artist', lazy=True)
 
+    __table_args__ = (
+      db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin',
+        postgresql_ops={'name': 'gin_trgm_ops'}),
+      # the (lower(name), id) order of the /artists directory
+      db.Index('ix_artist_lower_name_id', func.lower(name), id),
+    )
+
     def __repr__(self):
       return f'<Artist ID: {self.id}, Artist: {self.name}>'
 
+# '#' gathers every name that does not start with a letter from A to Z
+ARTIST_LETTERS = ['#'] + list(string.ascii_uppercase)
+
+class ArtistLetter(db.Model):
+    '''Number of artists per initial, for the A-Z index of /artists'''
+    __tablename__ = 'artist_letter'
+
+    letter = db.Column(db.String(1), primary_key=True)
+    artist_count = db.Column(db.Integer, nullable=False, default=0,
+      server_default='0')
+
+    def __repr__(self):
+      return f'<ArtistLetter {self.letter}: {self.artist_count}>'
+
+def artist_letter(name):
+    initial = (name or '')[:1].upper()
+    return initial if initial in ARTIST_LETTERS[1:] else '#'
+
+def refresh_artist_letters(connection):
+    '''
+    Recounts ArtistLetter.artist_count from the artist table. The ORM
+    listeners below keep the counts current for single writes; bulk loads
+    that bypass the ORM have to call this (see `flask refresh-counters`).
+    '''
+    initial = func.upper(func.substr(Artist.name, 1, 1))
+    artist_initial = case([(initial.in_(ARTIST_LETTERS[1:]), initial)], else_='#')
+    count = select([func.count(Artist.id)]) \
+        .where(artist_initial == ArtistLetter.letter) \
+        .as_scalar()
+    connection.execute(ArtistLetter.__table__.update().values(artist_count=count))
+
+@event.listens_for(ArtistLetter.__table__, 'after_create')
+def _insert_artist_letters(table, connection, **kwargs):
+    connection.execute(table.insert(),
+      [{'letter': letter, 'artist_count': 0} for letter in ARTIST_LETTERS])
+
+def _count_artist_letter(connection, name, delta):
+    connection.execute(ArtistLetter.__table__.update()
+      .where(ArtistLetter.letter == artist_letter(name))
+      .values(artist_count=ArtistLetter.artist_count + delta))
+
+@event.listens_for(Artist, 'after_insert')
+def _count_inserted_artist(mapper, connection, target):
+    _count_artist_letter(connection, target.name, 1)
+
+@event.listens_for(Artist, 'after_delete')
+def _count_deleted_artist(mapper, connection, target):
+    _count_artist_letter(connection, target.name, -1)
+
+@event.listens_for(Artist, 'after_update')
+def _count_renamed_artist(mapper, connection, target):
+    history = inspect(target).attrs.name.history
+    if history.deleted and history.added:
+      old, new = artist_letter(history.deleted[0]), artist_letter(history.added[0])
+      if old != new:
+        _count_artist_letter(connection, history.deleted[0], -1)
+        _count_artist_letter(connection, history.added[0], 1)
+
 
 # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
@@ -80,6 +244,75 @@ class Show(db.Model):
   artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'), nullable=False)
   start_time = db.Column(db.DateTime, nullable=False)
 
+  __table_args__ = (
+    db.Index('ix_show_start_time_id', 'start_time', 'id'),
+  )
+
   def __repr__(self):
     return f'Showing: {self.artist_id}, At: {self.venue_id}>'
-  
+
+def refresh_upcoming_show_counts(connection, venue_ids=None, artist_ids=None, now=None):
+    '''
+    Recomputes Venue/Artist.upcoming_show_count with one correlated UPDATE
+    per table, either for the given ids or, when they are None, for every
+    row. Shows only move from upcoming to past as time passes, so a full
+    refresh has to run periodically (see `flask refresh-counters`).
+    '''
+    now = now or datetime.utcnow()
+    for model, show_column, ids in (
+        (Venue, Show.venue_id, venue_ids), (Artist, Show.artist_id, artist_ids)):
+        if ids is not None and not ids:
+            continue
+        upcoming = select([func.count(Show.id)]) \
+            .where(show_column == model.id) \
+            .where(Show.start_time > now) \
+            .as_scalar()
+        update = model.__table__.update().values(upcoming_show_count=upcoming)
+        if ids is not None:
+            update = update.where(model.id.in_(ids))
+        connection.execute(update)
+
+@event.listens_for(Show, 'after_insert')
+@event.listens_for(Show, 'after_update')
+@event.listens_for(Show, 'after_delete')
+def _refresh_show_counters(mapper, connection, target):
+    # recount the venue and artist of the show (and the previous ones when
+    # an update moved it) inside the flush that wrote it
+    state = inspect(target)
+    venue_ids = set(state.attrs.venue_id.history.sum()) - {None}
+    artist_ids = set(state.attrs.artist_id.history.sum()) - {None}
+    refresh_upcoming_show_counts(connection, venue_ids, artist_ids)
+    bump_page_versions(connection, venue_ids, artist_ids)
+
+def bump_page_versions(connection, venue_ids=(), artist_ids=()):
+    '''
+    Increments Venue/Artist.page_version for the given ids, so their
+    cached detail pages are rebuilt on the next visit.
+    '''
+    for model, ids in ((Venue, venue_ids), (Artist, artist_ids)):
+        if ids:
+            connection.execute(model.__table__.update()
+                .where(model.id.in_(ids))
+                .values(page_version=model.page_version + 1))
+
+@event.listens_for(Venue, 'before_update')
+@event.listens_for(Artist, 'before_update')
+def _bump_page_version(mapper, connection, target):
+    # any change to the entity (columns or genres) changes its own page;
+    # its name and image also appear on the pages on the other side of
+    # its shows
+    target.page_version = type(target).page_version + 1
+    state = inspect(target)
+    if not (state.attrs.name.history.has_changes()
+            or state.attrs.image_link.history.has_changes()):
+        return
+    if isinstance(target, Venue):
+        own, other = Show.venue_id, Show.artist_id
+    else:
+        own, other = Show.artist_id, Show.venue_id
+    ids = [id for id, in connection.execute(
+        select([other]).where(own == target.id).distinct())]
+    if isinstance(target, Venue):
+        bump_page_versions(connection, artist_ids=ids)
+    else:
+        bump_page_versions(connection, venue_ids=ids)
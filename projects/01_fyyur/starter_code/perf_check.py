@@ -0,0 +1,200 @@
+#----------------------------------------------------------------------------#
+# Performance regression check.
+#
+#   python perf_check.py                   compare with perf_baseline.json
+#   python perf_check.py --update-baseline record a new baseline
+#
+# Seeds a fixed dataset into a scratch database (a throwaway SQLite file
+# unless --database-url is given; its tables are dropped and recreated),
+# requests every route of SCENARIO through the test client (artist and
+# venue pages both with and without the page cache) and records the
+# median and p95 latency and the number of queries per request. Exits with
+# status 1 when a route got slower or issues more queries than the baseline
+# allows. Without a baseline file, the run is recorded as the baseline.
+#----------------------------------------------------------------------------#
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perf_baseline.json')
+
+VENUES = 200
+ARTISTS = 200
+SHOWS = 4000
+
+# (name, method, url, form data, empty the page cache before each request)
+# the detail pages run cold, to time detail_page() and the templates, and
+# cached, to time the page_version lookup and the cache hit
+SCENARIO = [
+  ('GET /venues', 'get', '/venues', None, False),
+  ('POST /venues/search', 'post', '/venues/search', {'search_term': 'hop'}, False),
+  ('POST /artists/search', 'post', '/artists/search', {'search_term': 'band'}, False),
+  ('GET /venues/<id> cold', 'get', '/venues/1', None, True),
+  ('GET /venues/<id>', 'get', '/venues/1', None, False),
+  ('GET /artists/<id> cold', 'get', '/artists/1', None, True),
+  ('GET /artists/<id>', 'get', '/artists/1', None, False),
+  ('GET /artists', 'get', '/artists', None, False),
+  ('GET /artists?letter=', 'get', '/artists?letter=S', None, False),
+  ('GET /shows', 'get', '/shows', None, False),
+]
+
+def seed(db, Venue, Artist, Show, refresh_upcoming_show_counts, refresh_artist_letters):
+  rng = random.Random(0)
+  now = datetime.utcnow().replace(microsecond=0)
+  names = ['Hop', 'Band', 'Petals', 'Sax', 'Owls', 'Bells']
+  with db.engine.begin() as connection:
+    for model, size in ((Venue, VENUES), (Artist, ARTISTS)):
+      connection.execute(model.__table__.insert(), [{
+        'name': 'The {} {}'.format(rng.choice(names), i),
+        'city': ['San Francisco', 'New York', 'Austin'][i % 3],
+        'state': ['CA', 'NY', 'TX'][i % 3],
+      } for i in range(size)])
+    connection.execute(Show.__table__.insert(), [{
+      'venue_id': rng.randint(1, VENUES),
+      'artist_id': rng.randint(1, ARTISTS),
+      'start_time': now + timedelta(hours=rng.randint(-24 * 90, 24 * 90)),
+    } for _ in range(SHOWS)])
+    refresh_upcoming_show_counts(connection)
+    refresh_artist_letters(connection)
+
+def percentile(values, fraction):
+  values = sorted(values)
+  return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def run_scenario(database_url, rounds=30, warmup=5):
+  '''
+  {route: {'median_ms', 'p95_ms', 'queries'}} for every route of SCENARIO,
+  `queries` being the most any single request issued.
+  '''
+  os.environ['DATABASE_URL'] = database_url
+  from app import app, page_fragments
+  from instrumentation import record_queries
+  from models import (db, Venue, Artist, Show, refresh_upcoming_show_counts,
+    refresh_artist_letters)
+
+  results = {}
+  with app.app_context():
+    db.drop_all()
+    db.create_all()
+    seed(db, Venue, Artist, Show, refresh_upcoming_show_counts,
+      refresh_artist_letters)
+    client = app.test_client()
+    for name, method, url, data, cold in SCENARIO:
+      latencies, queries = [], 0
+      for i in range(warmup + rounds):
+        if cold:
+          page_fragments.clear()
+        with record_queries() as stats:
+          start = time.perf_counter()
+          response = getattr(client, method)(url, data=data)
+          # streamed pages only run their queries while being read
+          response.get_data()
+          elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+          raise SystemExit('{} returned {}'.format(name, response.status_code))
+        if i >= warmup:
+          latencies.append(elapsed * 1000)
+          queries = max(queries, stats.count)
+      results[name] = {
+        'median_ms': round(percentile(latencies, 0.5), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'queries': queries,
+      }
+    db.session.remove()
+    db.drop_all()
+  return results
+
+def change(base, now):
+  '''The growth from `base` to `now` as a percentage, or n/a from zero.'''
+  if not base:
+    return ' n/a'
+  return '{:>+4.0%}'.format(now / base - 1)
+
+def compare(baseline, current, latency_threshold, min_latency_ms, query_threshold):
+  '''
+  Prints a per-route table and returns the names of the routes that
+  regressed. A route regresses when its median latency grows by more
+  than `latency_threshold` (a fraction) and by more than `min_latency_ms`,
+  or when it issues more than `query_threshold` extra queries.
+  '''
+  print('{:<22} {:>23} {:>23} {:>10}'.format(
+    'route', 'median ms', 'p95 ms', 'queries'))
+  regressions = []
+  for name, _, _, _, _ in SCENARIO:
+    now = current[name]
+    base = baseline.get(name)
+    if base is None:
+      print('{:<22} {:>23.2f} {:>23.2f} {:>10}   (no baseline)'.format(
+        name, now['median_ms'], now['p95_ms'], now['queries']))
+      continue
+    slower = now['median_ms'] - base['median_ms']
+    flags = []
+    if (slower > base['median_ms'] * latency_threshold
+        and slower > min_latency_ms):
+      flags.append('slower')
+    if now['queries'] - base['queries'] > query_threshold:
+      flags.append('more queries')
+    if flags:
+      regressions.append(name)
+    print('{:<22} {:>7.2f} -> {:>7.2f} {:>4} {:>7.2f} -> {:>7.2f} {:>4} {:>3} -> {:<3} {}'.format(
+      name,
+      base['median_ms'], now['median_ms'], change(base['median_ms'], now['median_ms']),
+      base['p95_ms'], now['p95_ms'], change(base['p95_ms'], now['p95_ms']),
+      base['queries'], now['queries'],
+      'REGRESSED: ' + ', '.join(flags) if flags else ''))
+  return regressions
+
+def main():
+  parser = argparse.ArgumentParser(
+    description='Compare route latency and query counts with a stored baseline.')
+  parser.add_argument('--baseline', default=BASELINE)
+  parser.add_argument('--update-baseline', action='store_true',
+    help='record the results as the new baseline instead of comparing')
+  parser.add_argument('--database-url',
+    help='scratch database to run against (default: a temporary SQLite file)')
+  parser.add_argument('--rounds', type=int, default=30)
+  parser.add_argument('--latency-threshold', type=float, default=0.25,
+    help='allowed median latency growth, as a fraction (default 0.25)')
+  parser.add_argument('--min-latency-ms', type=float, default=1.0,
+    help='ignore latency growth below this many milliseconds (default 1)')
+  parser.add_argument('--query-threshold', type=int, default=0,
+    help='allowed extra queries per request (default 0)')
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as directory:
+    database_url = args.database_url or 'sqlite:///{}'.format(
+      os.path.join(directory, 'perf_check.db'))
+    current = run_scenario(database_url, args.rounds)
+
+  if not args.update_baseline and not os.path.exists(args.baseline):
+    # a fresh checkout: nothing to compare with yet, so this run becomes
+    # the baseline rather than blocking the deploy
+    print('WARNING: no baseline at {}; recording this run as the baseline.'
+      ' Review and commit it so later deploys are compared with it;'
+      ' fab prepare and fab deploy leave it out of their commit.'.format(args.baseline))
+    args.update_baseline = True
+
+  if args.update_baseline:
+    with open(args.baseline, 'w') as file:
+      json.dump(current, file, indent=2, sort_keys=True)
+      file.write('\n')
+    print('Baseline written to {}'.format(args.baseline))
+    return 0
+  with open(args.baseline) as file:
+    baseline = json.load(file)
+  regressions = compare(baseline, current, args.latency_threshold,
+    args.min_latency_ms, args.query_threshold)
+  if regressions:
+    print('\n{} route(s) regressed: {}'.format(len(regressions), ', '.join(regressions)))
+    return 1
+  print('\nNo performance regressions.')
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
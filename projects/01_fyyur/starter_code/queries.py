@@ -0,0 +1,268 @@
+#----------------------------------------------------------------------------#
+# Read-side queries used by the controllers in app.py.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import db, Venue, Artist, ArtistLetter, Show, ARTIST_LETTERS
+
+SEARCH_RESULTS_PER_PAGE = 20
+SHOWS_PER_PAGE = 30
+ARTISTS_PER_PAGE = 50
+
+#----------------------------------------------------------------------------#
+# Venues.
+#----------------------------------------------------------------------------#
+
+def venue_areas():
+  '''
+  Groups every venue by city/state together with its number of upcoming
+  shows, read from the denormalized Venue.upcoming_show_count column.
+  '''
+  rows = db.session.query(
+      Venue.city,
+      Venue.state,
+      Venue.id,
+      Venue.name,
+      Venue.upcoming_show_count.label('num_upcoming_shows')
+    ).order_by(Venue.state, Venue.city, Venue.name) \
+    .all()
+
+  areas = []
+  for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+    areas.append({
+      "city": city,
+      "state": state,
+      "venues": [{
+        "id": venue.id,
+        "name": venue.name,
+        "num_upcoming_shows": venue.num_upcoming_shows
+      } for venue in venues]
+    })
+  return areas
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+def search_by_name(model, term, page=1):
+  '''
+  Case-insensitive substring search on `model.name` (Artist or Venue).
+  Matching rows, their upcoming show counts and the total number of
+  matches all come back from one query. On PostgreSQL the ILIKE is served
+  by the pg_trgm GIN index and hits are ranked by similarity; other
+  databases fall back to ranking by match position.
+  '''
+  term = (term or '').strip()
+  pattern = '%{}%'.format(
+    term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+  if db.engine.dialect.name == 'postgresql':
+    rank = func.similarity(model.name, term).desc()
+  else:
+    rank = func.instr(func.lower(model.name), term.lower())
+
+  rows = db.session.query(
+      model.id,
+      model.name,
+      model.upcoming_show_count.label('num_upcoming_shows'),
+      func.count().over().label('total')
+    ).filter(model.name.ilike(pattern, escape='\\')) \
+    .order_by(rank, model.name, model.id) \
+    .limit(SEARCH_RESULTS_PER_PAGE) \
+    .offset((max(page, 1) - 1) * SEARCH_RESULTS_PER_PAGE) \
+    .all()
+
+  count = rows[0].total if rows else 0
+  return {
+    "count": count,
+    "page": page,
+    "has_next": page * SEARCH_RESULTS_PER_PAGE < count,
+    "data": [{
+      "id": row.id,
+      "name": row.name,
+      "num_upcoming_shows": row.num_upcoming_shows
+    } for row in rows]
+  }
+
+#----------------------------------------------------------------------------#
+# Artist directory.
+#----------------------------------------------------------------------------#
+
+def artist_cursor(artist):
+  '''
+  Encodes the (lower(name), id) position of an artist for the `after` and
+  `before` parameters of /artists.
+  '''
+  return '{}_{}'.format(artist["sort_name"], artist["id"])
+
+def parse_artist_cursor(cursor):
+  '''
+  Decodes a value produced by artist_cursor(); returns None for a missing
+  or malformed cursor.
+  '''
+  try:
+    sort_name, _, artist_id = cursor.rpartition('_')
+    return sort_name, int(artist_id)
+  except (AttributeError, ValueError):
+    return None
+
+def artist_letters():
+  '''
+  [(letter, number of artists)] for the A-Z index, read from the
+  precomputed ArtistLetter counts.
+  '''
+  counts = dict(db.session.query(ArtistLetter.letter, ArtistLetter.artist_count))
+  return [(letter, counts.get(letter, 0)) for letter in ARTIST_LETTERS]
+
+def artist_directory(after=None, before=None, letter=None, limit=ARTISTS_PER_PAGE):
+  '''
+  One page of artists in (lower(name), id) order: the page after or before
+  a cursor, the page starting at a letter of the A-Z index, or the first
+  page. Every page is a range scan of the ix_artist_lower_name_id index,
+  so deep pages cost the same as the first one. One extra row is fetched
+  to tell whether there is a page beyond this one.
+
+  Returns {'artists': [...], 'previous': cursor or None, 'next': cursor or None}.
+  '''
+  sort_name = func.lower(Artist.name)
+  position = tuple_(sort_name, Artist.id)
+  query = db.session.query(Artist.id, Artist.name, sort_name.label('sort_name'))
+
+  if before is not None:
+    rows = query.filter(position < tuple_(*before)) \
+      .order_by(sort_name.desc(), Artist.id.desc()) \
+      .limit(limit + 1).all()
+    if len(rows) <= limit:
+      # reached the start: show a full first page instead
+      return artist_directory(limit=limit)
+    rows, has_previous, has_next = rows[:limit][::-1], True, True
+  else:
+    if after is not None:
+      query = query.filter(position > tuple_(*after))
+    elif letter is not None:
+      query = query.filter(sort_name >= letter.lower())
+    rows = query.order_by(sort_name, Artist.id).limit(limit + 1).all()
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    has_previous = after is not None
+    if letter is not None and after is None and rows:
+      first = tuple_(rows[0].sort_name, rows[0].id)
+      has_previous = db.session.query(
+        db.session.query(Artist.id).filter(position < first).exists()).scalar()
+
+  artists = [row._asdict() for row in rows]
+  return {
+    "artists": artists,
+    "previous": artist_cursor(artists[0]) if artists and has_previous else None,
+    "next": artist_cursor(artists[-1]) if artists and has_next else None,
+  }
+
+#----------------------------------------------------------------------------#
+# Detail pages.
+#----------------------------------------------------------------------------#
+
+def detail_page(model, entity_id, now=None):
+  '''
+  Builds the template data for an artist or venue page. The entity and its
+  genres are loaded in one query and all of its shows, together with the
+  artist/venue on the other side, in a second one; past and upcoming shows
+  are then split in Python. Returns None when the entity does not exist.
+  '''
+  now = now or datetime.utcnow()
+  counterpart = 'venue' if model is Artist else 'artist'
+  entity = db.session.query(model).options(
+      joinedload(model.genres),
+      selectinload(model.shows).joinedload(getattr(Show, counterpart))
+    ).filter(model.id == entity_id).one_or_none()
+  if entity is None:
+    return None
+
+  data = {column.name: getattr(entity, column.name)
+    for column in model.__table__.columns}
+  data["genres"] = [genre.name for genre in entity.genres]
+  past_shows = []
+  upcoming_shows = []
+  for show in sorted(entity.shows, key=lambda show: show.start_time):
+    other = getattr(show, counterpart)
+    shows = upcoming_shows if show.start_time > now else past_shows
+    shows.append({
+      counterpart + "_id": other.id,
+      counterpart + "_name": other.name,
+      counterpart + "_image_link": other.image_link,
+      "start_time": show.start_time
+    })
+  data["past_shows"] = past_shows
+  data["upcoming_shows"] = upcoming_shows
+  data["past_shows_count"] = len(past_shows)
+  data["upcoming_shows_count"] = len(upcoming_shows)
+  return data
+
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+def show_cursor(show):
+  '''
+  Encodes the (start_time, id) position of a show for the `after`
+  parameter of /shows.
+  '''
+  return '{}_{}'.format(show["start_time"].isoformat(), show["show_id"])
+
+def parse_show_cursor(cursor):
+  '''
+  Decodes a value produced by show_cursor(); returns None for a missing
+  or malformed cursor so that the listing starts from the first page.
+  '''
+  try:
+    start_time, _, show_id = cursor.rpartition('_')
+    return datetime.fromisoformat(start_time), int(show_id)
+  except (AttributeError, ValueError):
+    return None
+
+class ShowPage:
+  '''
+  One page of shows from show_listing(). Iterating yields the shows as
+  dicts while their rows are fetched; once iteration has finished, `next`
+  is the cursor of the following page, or None when this is the last one.
+  '''
+  def __init__(self, rows, limit):
+    self._rows = rows
+    self.limit = limit
+    self.next = None
+
+  def __iter__(self):
+    show = None
+    for count, row in enumerate(self._rows):
+      if count < self.limit:
+        show = row._asdict()
+        yield show
+      else:
+        # the extra row only tells that another page follows
+        self.next = show_cursor(show)
+
+def show_listing(after=None, limit=SHOWS_PER_PAGE):
+  '''
+  One page of shows ordered by (start_time, id), starting after the given
+  (start_time, id) position, as a ShowPage. Only the columns shows.html
+  renders are selected, venue and artist are joined in the same query,
+  and rows are fetched in batches so the page can be streamed while it is
+  read. One extra row is fetched to tell whether there is a next page.
+  '''
+  query = db.session.query(
+      Show.id.label('show_id'),
+      Show.start_time,
+      Show.venue_id,
+      Venue.name.label('venue_name'),
+      Show.artist_id,
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')
+    ).join(Venue, Venue.id == Show.venue_id) \
+    .join(Artist, Artist.id == Show.artist_id)
+  if after is not None:
+    query = query.filter(tuple_(Show.start_time, Show.id) > tuple_(*after))
+  rows = query.order_by(Show.start_time, Show.id).limit(limit + 1).yield_per(10)
+  return ShowPage(rows, limit)
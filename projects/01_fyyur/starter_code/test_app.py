@@ -0,0 +1,453 @@
+import io
+import os
+import re
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import app, page_fragments
+from benchmarks import legacy_format_datetime
+from filters import format_datetime
+from fragments import FragmentCache
+from instrumentation import record_queries
+from models import (db, Venue, Artist, ArtistLetter, Show, Genre, genre_ids,
+    get_or_create_genres, refresh_artist_letters)
+from perf_check import SCENARIO, compare
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        self.app = app
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        """Executed after reach test"""
+        db.session.remove()
+        db.drop_all()
+        genre_ids.clear()
+        page_fragments.clear()
+        self.ctx.pop()
+
+    def seed(self, venues, shows_per_venue=2):
+        artist = Artist(name='The Wild Sax Band', city='San Francisco', state='CA')
+        db.session.add(artist)
+        now = datetime.utcnow()
+        for i in range(venues):
+            venue = Venue(
+                name='Venue {}'.format(i),
+                city=['San Francisco', 'New York'][i % 2],
+                state=['CA', 'NY'][i % 2])
+            venue.shows = [
+                Show(artist=artist, start_time=now + timedelta(days=day, hours=1))
+                for day in range(-shows_per_venue, shows_per_venue)]
+            db.session.add(venue)
+        db.session.commit()
+
+    def count_queries(self, method, url, **kwargs):
+        with record_queries() as stats:
+            response = getattr(self.client(), method)(url, **kwargs)
+            # streamed responses only run their queries while being read
+            response.get_data()
+        return response, stats.count
+
+    def assertMaxQueries(self, limit, method, url, **kwargs):
+        """Request `url` and fail if it ran more than `limit` queries"""
+        with record_queries() as stats:
+            response = getattr(self.client(), method)(url, **kwargs)
+            response.get_data()
+        if stats.count > limit:
+            self.fail('{} {} ran {} queries, expected at most {}:\n{}'.format(
+                method.upper(), url, stats.count, limit, '\n'.join(
+                    '{:>4} x {}'.format(count, template)
+                    for template, count in stats.templates.most_common())))
+        return response
+
+    def test_venues_grouped_by_area(self):
+        self.seed(4)
+        response = self.client().get('/venues')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data.count(b'San Francisco, CA'), 1)
+        self.assertEqual(response.data.count(b'New York, NY'), 1)
+        self.assertIn(b'Venue 3', response.data)
+
+    def test_venues_query_count_is_constant(self):
+        self.seed(5)
+        response, small = self.count_queries('get', '/venues')
+        self.assertEqual(response.status_code, 200)
+
+        self.seed(50)
+        response, large = self.count_queries('get', '/venues')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(small, large)
+
+    def test_search_artists_is_case_insensitive(self):
+        self.seed(2)
+        db.session.add(Artist(name='Guns N Petals'))
+        db.session.commit()
+        response = self.client().post(
+            '/artists/search', data={'search_term': 'BAND'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'The Wild Sax Band', response.data)
+        self.assertNotIn(b'Guns N Petals', response.data)
+
+    def test_search_venues_paginates_in_one_query(self):
+        self.seed(25)
+        response, queries = self.count_queries(
+            'post', '/venues/search', data={'search_term': 'venue', 'page': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'"venue": 25', response.data)
+        self.assertIn(b'Previous', response.data)
+        self.assertNotIn(b'Next', response.data)
+        self.assertEqual(queries, 1)
+
+    def test_show_venue_loads_in_three_queries(self):
+        self.seed(1, shows_per_venue=10)
+        # page version, venue with genres, shows with artists
+        response = self.assertMaxQueries(3, 'get', '/venues/1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'10 Upcoming Shows', response.data)
+        self.assertIn(b'10 Past Shows', response.data)
+        self.assertIn(b'The Wild Sax Band', response.data)
+
+    def test_show_artist_loads_in_three_queries(self):
+        self.seed(10, shows_per_venue=1)
+        response = self.assertMaxQueries(3, 'get', '/artists/1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'10 Upcoming Shows', response.data)
+        self.assertIn(b'Venue 9', response.data)
+
+    def test_cached_detail_page_costs_one_query(self):
+        self.seed(2)
+        first = self.client().get('/artists/1')
+        second = self.assertMaxQueries(1, 'get', '/artists/1')
+
+        self.assertEqual(second.data, first.data)
+        self.assertIn(b'<title>The Wild Sax Band | Artist</title>', second.data)
+
+    def test_cached_page_keeps_layout_fresh(self):
+        self.seed(1)
+        self.client().get('/venues/1')
+        with self.client() as client:
+            with client.session_transaction() as session:
+                session['_flashes'] = [('message', 'Hello from the layout')]
+            response = client.get('/venues/1')
+
+        self.assertIn(b'Hello from the layout', response.data)
+        self.assertIn(b'Venue 0', response.data)
+
+    def test_edits_and_new_shows_refresh_cached_pages(self):
+        self.seed(1, shows_per_venue=1)
+        self.assertIn(b'1 Upcoming Show<', self.client().get('/venues/1').data)
+
+        venue = Venue.query.one()
+        venue.name = 'The Musical Hop'
+        db.session.commit()
+        self.assertIn(b'The Musical Hop', self.client().get('/venues/1').data)
+
+        db.session.add(Show(venue=venue, artist=Artist.query.one(),
+            start_time=datetime.utcnow() + timedelta(days=3)))
+        db.session.commit()
+        self.assertIn(b'2 Upcoming Shows', self.client().get('/venues/1').data)
+
+    def test_renamed_artist_refreshes_venue_pages(self):
+        self.seed(2)
+        self.client().get('/venues/2')
+
+        Artist.query.one().name = 'Guns N Petals'
+        db.session.commit()
+        data = self.client().get('/venues/2').data
+
+        self.assertIn(b'Guns N Petals', data)
+        self.assertNotIn(b'The Wild Sax Band', data)
+
+    def test_fragment_cache_expiry_and_bound(self):
+        expires = datetime(2020, 5, 21, 21, 30)
+        cache = FragmentCache(maxsize=2)
+        cache.set('venue-1-0', {'content': '<p>1</p>'}, expires)
+        self.assertEqual(
+            cache.get('venue-1-0', now=expires - timedelta(seconds=1)),
+            {'content': '<p>1</p>'})
+        self.assertIsNone(cache.get('venue-1-0', now=expires))
+
+        cache.set('venue-2-0', {'content': '<p>2</p>'})
+        cache.set('venue-3-0', {'content': '<p>3</p>'})
+        self.assertIsNone(cache.get('venue-1-0', now=expires - timedelta(days=1)))
+        self.assertIsNotNone(cache.get('venue-3-0'))
+
+    def test_fragment_cache_directory_is_shared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            expires = datetime(2020, 5, 21, 21, 30)
+            FragmentCache(directory=directory).set(
+                'artist-1-4', {'content': '<p>shows</p>'}, expires)
+            other = FragmentCache(maxsize=1, directory=directory)
+
+            blocks = other.get('artist-1-4', now=expires - timedelta(hours=1))
+            self.assertEqual(blocks, {'content': '<p>shows</p>'})
+            self.assertIsNone(other.get('artist-1-4', now=expires))
+
+            other.set('artist-2-0', {'content': '<p>2</p>'})
+            self.assertEqual(os.listdir(directory), ['artist-2-0.json'])
+
+    def test_db_timing_headers(self):
+        self.seed(3)
+        response, queries = self.count_queries('get', '/venues')
+
+        self.assertEqual(response.headers['X-DB-Queries'], str(queries))
+        self.assertRegex(
+            response.headers['Server-Timing'],
+            r'^db;dur=\d+\.\d;desc="{} queries"$'.format(queries))
+
+    def test_repeated_statement_is_logged(self):
+        self.seed(3)
+        self.app.config['SQL_REPEATED_QUERY_THRESHOLD'] = 2
+        try:
+            with self.assertLogs(self.app.logger, 'WARNING') as logs:
+                with self.app.test_request_context('/venues'):
+                    self.app.preprocess_request()
+                    # an N+1 loop: one lookup per venue id
+                    for venue_id in (1, 2, 3):
+                        Venue.query.filter_by(id=venue_id).one()
+                    self.app.do_teardown_request()
+        finally:
+            self.app.config['SQL_REPEATED_QUERY_THRESHOLD'] = 10
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('GET /venues ran the same statement 3 times', logs.output[0])
+        self.assertIn('WHERE venue.id = ?', logs.output[0])
+
+    def test_shows_keyset_pagination(self):
+        self.seed(10)
+        response, queries = self.count_queries('get', '/shows')
+        data = response.get_data()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data.count(b'tile-show'), 30)
+        self.assertEqual(queries, 1)
+
+        cursor = data.split(b'/shows?after=')[1].split(b'"')[0].decode()
+        response = self.client().get('/shows?after=' + cursor)
+        data = response.get_data()
+        self.assertEqual(data.count(b'tile-show'), 10)
+        self.assertNotIn(b'More shows', data)
+
+    def test_shows_exactly_full_last_page_has_no_next_link(self):
+        self.seed(15, shows_per_venue=1)
+        response, queries = self.count_queries('get', '/shows')
+        data = response.get_data()
+
+        self.assertEqual(data.count(b'tile-show'), 30)
+        self.assertNotIn(b'More shows', data)
+        self.assertEqual(queries, 1)
+
+    def add_artists(self, names):
+        db.session.add_all([Artist(name=name) for name in names])
+        db.session.commit()
+
+    def letter_counts(self):
+        return {letter.letter: letter.artist_count
+                for letter in ArtistLetter.query.all() if letter.artist_count}
+
+    def directory_names(self, data):
+        return [name.decode() for name in
+                re.findall(rb'<h5>(.*?)</h5>', data)]
+
+    def test_artist_directory_keyset_pages(self):
+        names = ['Artist {:03d}'.format(i) for i in range(120)]
+        self.add_artists(reversed(names))
+
+        response, first_queries = self.count_queries('get', '/artists')
+        page = self.directory_names(response.data)
+        self.assertEqual(page, names[:50])
+        self.assertNotIn(b'Previous', response.data)
+
+        next_url = re.search(rb'href="(/artists\?after=[^"]+)"', response.data).group(1)
+        response = self.client().get(next_url.decode())
+        self.assertEqual(self.directory_names(response.data), names[50:100])
+
+        next_url = re.search(rb'href="(/artists\?after=[^"]+)"', response.data).group(1)
+        response, deep_queries = self.count_queries(
+            'get', next_url.decode())
+        self.assertEqual(self.directory_names(response.data), names[100:])
+        self.assertNotIn(b'Next', response.data)
+        # the A-Z counts and the page itself, however deep the page is
+        self.assertEqual(first_queries, 2)
+        self.assertEqual(deep_queries, 2)
+
+        previous_url = re.search(rb'href="(/artists\?before=[^"]+)"', response.data).group(1)
+        response = self.client().get(previous_url.decode())
+        self.assertEqual(self.directory_names(response.data), names[50:100])
+
+    def test_artist_directory_letter_jump(self):
+        self.add_artists(['abba', 'Blur', 'beach house', 'Cream', '311', 'Zhané'])
+
+        data = self.client().get('/artists?letter=b').data
+        self.assertEqual(self.directory_names(data), [
+            'beach house', 'Blur', 'Cream', 'Zhané'])
+        self.assertIn(b'Previous', data)
+        self.assertIn(b'title="2 artists">B</a>', data)
+        self.assertIn(b'<li class="disabled"><span>D</span></li>', data)
+
+        data = self.client().get('/artists?letter=%23').data
+        self.assertEqual(self.directory_names(data)[:2], ['311', 'abba'])
+
+    def test_artist_letter_counts_follow_writes(self):
+        self.add_artists(['Abba', 'Blur', '311'])
+        self.assertEqual(self.letter_counts(), {'A': 1, 'B': 1, '#': 1})
+
+        Artist.query.filter_by(name='Blur').one().name = 'Air'
+        db.session.delete(Artist.query.filter_by(name='311').one())
+        db.session.commit()
+        self.assertEqual(self.letter_counts(), {'A': 2})
+
+        db.session.execute(Artist.__table__.insert(), [{'name': 'Cream'}])
+        refresh_artist_letters(db.session.connection())
+        db.session.commit()
+        self.assertEqual(self.letter_counts(), {'A': 2, 'C': 1})
+
+    def test_create_artist_reuses_genres(self):
+        for name in ('Guns N Petals', 'Matt Quevedo'):
+            response = self.client().post('/artists/create', data={
+                'name': name, 'genres': ['Jazz', 'Rock', 'Jazz']})
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(
+            sorted(genre.name for genre in Genre.query.all()), ['Jazz', 'Rock'])
+        self.assertEqual(
+            [len(artist.genres) for artist in Artist.query.all()], [2, 2])
+
+    def test_second_create_resolves_genres_from_cache(self):
+        self.client().post('/artists/create', data={
+            'name': 'Guns N Petals', 'genres': ['Jazz', 'Rock']})
+        self.assertEqual(sorted(genre_ids), ['Jazz', 'Rock'])
+
+        with record_queries() as stats:
+            self.client().post('/venues/create', data={
+                'name': 'The Musical Hop', 'genres': ['Rock', 'Jazz']})
+
+        genre_statements = [template for template in stats.templates
+                            if re.search(r'\bgenre\b', template)]
+        self.assertEqual(genre_statements, [])
+        self.assertEqual(len(Venue.query.one().genres), 2)
+
+    def test_genre_ids_are_cached_after_commit(self):
+        get_or_create_genres(['Jazz'])
+        self.assertEqual(genre_ids, {})
+
+        db.session.commit()
+
+        self.assertEqual(genre_ids, {'Jazz': Genre.query.one().id})
+
+    def test_rolled_back_genre_ids_are_not_cached(self):
+        get_or_create_genres(['Jazz'])
+        db.session.rollback()
+
+        self.assertEqual(genre_ids, {})
+        self.assertEqual(Genre.query.count(), 0)
+        # the name is resolved again instead of reusing the lost id
+        self.assertEqual(len(get_or_create_genres(['Jazz'])), 1)
+        db.session.commit()
+        self.assertEqual(genre_ids, {'Jazz': Genre.query.one().id})
+
+    def test_closed_session_does_not_publish_genre_ids(self):
+        get_or_create_genres(['Jazz'])
+        db.session.remove()
+        db.session.commit()
+
+        self.assertEqual(genre_ids, {})
+
+    def test_renamed_genre_invalidates_cache(self):
+        get_or_create_genres(['Jazz'])
+        db.session.commit()
+        Genre.query.one().name = 'Swing'
+        db.session.commit()
+        self.assertEqual(genre_ids, {})
+
+    def test_create_venue_commits_once(self):
+        commits = []
+
+        def after_commit(session):
+            commits.append(session)
+
+        event.listen(db.session, 'after_commit', after_commit)
+        try:
+            self.client().post('/venues/create', data={
+                'name': 'The Musical Hop', 'genres': ['Jazz', 'Reggae', 'Swing']})
+        finally:
+            event.remove(db.session, 'after_commit', after_commit)
+
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(len(Venue.query.one().genres), 3)
+
+    def test_upcoming_show_counters_follow_show_writes(self):
+        self.seed(1, shows_per_venue=3)
+        venue = Venue.query.one()
+        artist = Artist.query.one()
+        self.assertEqual(venue.upcoming_show_count, 3)
+        self.assertEqual(artist.upcoming_show_count, 3)
+
+        db.session.delete(Show.query.order_by(Show.start_time.desc()).first())
+        db.session.commit()
+        self.assertEqual(venue.upcoming_show_count, 2)
+        self.assertEqual(artist.upcoming_show_count, 2)
+
+    def test_refresh_counters_command(self):
+        self.seed(1, shows_per_venue=3)
+        # move every show into the past behind the ORM's back
+        db.session.execute(Show.__table__.update().values(
+            start_time=datetime.utcnow() - timedelta(hours=1)))
+        db.session.commit()
+        self.assertEqual(Venue.query.one().upcoming_show_count, 3)
+
+        result = self.app.test_cli_runner().invoke(args=['refresh-counters'])
+        db.session.expire_all()
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(Venue.query.one().upcoming_show_count, 0)
+        self.assertEqual(Artist.query.one().upcoming_show_count, 0)
+
+    def test_datetime_filter_matches_legacy_output(self):
+        start_time = datetime(2019, 5, 21, 21, 30)
+        for format in ('full', 'medium'):
+            self.assertEqual(
+                format_datetime(start_time, format),
+                legacy_format_datetime(str(start_time), format))
+            self.assertEqual(
+                format_datetime(str(start_time), format),
+                format_datetime(start_time, format))
+
+    def test_perf_compare_with_zero_baseline(self):
+        zero = {'median_ms': 0.0, 'p95_ms': 0.0, 'queries': 0}
+        slow = {'median_ms': 5.0, 'p95_ms': 8.0, 'queries': 0}
+        baseline = {name: zero for name, _, _, _, _ in SCENARIO}
+        current = {name: slow for name, _, _, _, _ in SCENARIO}
+        with redirect_stdout(io.StringIO()) as output:
+            regressions = compare(baseline, current, 0.25, 1.0, 0)
+
+        self.assertEqual(regressions, [name for name, _, _, _, _ in SCENARIO])
+        self.assertIn('n/a', output.getvalue())
+
+    def test_show_nonexistent_artist(self):
+        response = self.client().get('/artists/1000')
+        self.assertEqual(response.status_code, 404)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
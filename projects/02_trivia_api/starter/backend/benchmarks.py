@@ -0,0 +1,85 @@
+'''
+Benchmarks for the trivia backend.
+
+    python benchmarks.py [--sizes 10000 1000000] [--database-path URL]
+
+Without --database-path each size is loaded into a throwaway SQLite file.
+'''
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from flask import Flask
+
+from flaskr import random_quiz_question
+from flaskr.seed import empty_tables, seed_database
+from models import setup_db, db, Question
+
+def load_questions(size, seed=0):
+    """ Replace the categories and questions with trivia.psql's categories
+    and `size` synthetic questions, numbered from 1 """
+    db.session.remove()
+    with db.engine.begin() as connection:
+        empty_tables(connection)
+        seed_database(connection, questions=size, seed=seed)
+
+
+def legacy_quiz_question(category_id, previous_questions):
+    # /quizzes as it was before random_quiz_question(): load every eligible
+    # question (twice for "all categories") and pick one in Python
+    questions = Question.query.filter_by(
+        category=category_id
+    ).filter(Question.id.notin_(previous_questions)).all()
+    if category_id == 0:
+        questions = Question.query.filter(
+            Question.id.notin_(previous_questions)).all()
+    return random.choice(questions) if questions else None
+
+
+def timed(function, rounds, *args):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        function(*args)
+        db.session.remove()
+    return (time.perf_counter() - start) / rounds
+
+
+def bench_quiz(size, rounds=5):
+    """ Average seconds per quiz question, legacy vs sampler """
+    load_questions(size)
+    previous = random.Random(1).sample(range(1, size + 1), min(size // 2, 5000))
+    results = []
+    for label, category_id in (('category', 1), ('all', 0)):
+        legacy = timed(legacy_quiz_question, rounds, category_id, previous)
+        current = timed(random_quiz_question, rounds, category_id, previous)
+        results.append((label, legacy, current))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 1000000])
+    parser.add_argument('--database-path')
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            app = Flask(__name__)
+            database_path = args.database_path or 'sqlite:///{}'.format(
+                os.path.join(directory, 'trivia.db'))
+            with app.app_context():
+                setup_db(app, database_path, schema='create')
+                for label, legacy, current in bench_quiz(size):
+                    print('quiz {:>8} questions, {:<8} legacy {:8.4f}s'
+                          '  sampler {:8.4f}s  speedup {:7.1f}x'.format(
+                              size, label, legacy, current,
+                              legacy / current))
+                db.session.remove()
+                db.get_engine(app).dispose()
+
+
+if __name__ == '__main__':
+    main()
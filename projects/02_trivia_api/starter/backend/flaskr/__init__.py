@@ -2,17 +2,136 @@ import os
 from flask import Flask, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+import json
 import random
+import re
+from sqlalchemy import Integer, all_, bindparam, column, func, select
+from sqlalchemy.dialects import postgresql
 
-from models import setup_db, Question, Category
+from models import setup_db, db, Question
+from .catalogue import category_catalogue
+from .seed import seed_command, upgrade_schema_command
+from .startup import startup_profile
 
 QUESTIONS_PER_PAGE = 10
+# above this many rows the planner's estimate stands in for COUNT(*)
+EXACT_COUNT_LIMIT = 100000
+
+
+def paginate_questions(query, page=1, after=None):
+    """ Format one page of questions, sliced by the database
+
+    With `after` the page starts after that question id (keyset
+    pagination), which costs the same however deep the page is.
+    """
+    query = query.order_by(Question.id)
+    if after is not None:
+        query = query.filter(Question.id > after)
+    else:
+        query = query.offset((max(page, 1) - 1) * QUESTIONS_PER_PAGE)
+    return [question.format()
+            for question in query.limit(QUESTIONS_PER_PAGE).all()]
+
+
+def count_questions(category=None):
+    """ Count questions, overall or in one category
+
+    On PostgreSQL the whole-table count uses the planner's row estimate
+    once the table is too large for an exact COUNT(*) to be cheap.
+    """
+    if category is None and db.engine.dialect.name == 'postgresql':
+        estimate = db.session.execute(
+            "SELECT reltuples::bigint FROM pg_class"
+            " WHERE oid = 'questions'::regclass").scalar()
+        if estimate and estimate > EXACT_COUNT_LIMIT:
+            return estimate
+    query = db.session.query(func.count(Question.id))
+    if category is not None:
+        query = query.filter(Question.category == category)
+    return query.scalar()
+
+
+def search_questions_page(search_term, page=1):
+    """ Find one page of questions matching `search_term`
+
+    PostgreSQL matches the words of the term against the trigger-maintained
+    `search_vector` (the last word as a prefix, for search-as-you-type) and
+    ranks hits with ts_rank; other databases fall back to a case-insensitive
+    LIKE. Returns the formatted page and the total number of matches, both
+    from a single query.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        words = re.findall(r'\w+', search_term or '')
+        if not words:
+            return [], 0
+        words[-1] += ':*'
+        query_vector = func.to_tsquery('pg_catalog.english', ' & '.join(words))
+        match = Question.search_vector.op('@@')(query_vector)
+        rank = func.ts_rank(Question.search_vector, query_vector).desc()
+    else:
+        pattern = '%{}%'.format(re.sub(r'([\\%_])', r'\\\1', search_term or ''))
+        match = Question.question.ilike(pattern, escape='\\')
+        rank = func.instr(func.lower(Question.question),
+                          (search_term or '').lower())
+
+    rows = db.session.query(Question, func.count().over()) \
+        .filter(match) \
+        .order_by(rank, Question.id) \
+        .limit(QUESTIONS_PER_PAGE) \
+        .offset((max(page, 1) - 1) * QUESTIONS_PER_PAGE) \
+        .all()
+    total = rows[0][1] if rows else 0
+    return [question.format() for question, _ in rows], total
+
+
+def random_quiz_question(category_id=0, previous_questions=()):
+    """ Pick a random question the player has not seen yet
+
+    Counts the eligible questions and fetches the one at a random offset,
+    so only a single row is ever loaded. Should questions be deleted between
+    the two queries and the offset land past the end, one is picked with
+    ORDER BY random() instead. The previous question ids are
+    sent as one array (PostgreSQL) or JSON (SQLite) parameter, however
+    many there are. A category id of 0 means all categories.
+    """
+    query = Question.query
+    if category_id:
+        query = query.filter(Question.category == category_id)
+    if previous_questions:
+        previous_questions = [int(id) for id in previous_questions]
+        if db.engine.dialect.name == 'postgresql':
+            previous = bindparam('previous', previous_questions,
+                                 type_=postgresql.ARRAY(Integer))
+            query = query.filter(Question.id != all_(previous))
+        else:
+            previous = select([column('value')]).select_from(
+                func.json_each(json.dumps(previous_questions)))
+            query = query.filter(Question.id.notin_(previous))
+
+    remaining = query.with_entities(func.count(Question.id)).scalar()
+    if not remaining:
+        return None
+    question = query.order_by(Question.id) \
+        .offset(random.randrange(remaining)) \
+        .first()
+    if question is None:
+        question = query.order_by(func.random()).first()
+    return question
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+    if test_config is None:
+        setup_db(app)
+    else:
+        app.config.from_mapping(test_config)
+        setup_db(app, test_config['SQLALCHEMY_DATABASE_URI'],
+                 test_config.get('SCHEMA_SETUP'))
+    category_catalogue.invalidate()
+    app.cli.add_command(seed_command)
+    app.cli.add_command(upgrade_schema_command)
+    app.cli.add_command(startup_profile)
 
     '''
   @TODO: Set up CORS. Allow '*' for origins.
@@ -43,9 +162,10 @@ def create_app(test_config=None):
     @app.route('/categories')
     def categories():
         """ Get all categories """
-        categories = Category.query.all()
-        for category in categories:
-          return jsonify({'categories': {category.id: category.type}}), 200
+        categories, etag = category_catalogue.current()
+        response = jsonify({'categories': categories})
+        response.set_etag(etag)
+        return response.make_conditional(request)
 
     '''
   @TODO:
@@ -65,21 +185,17 @@ def create_app(test_config=None):
     def questions():
         """ Get all questions """
         page = request.args.get('page', 1, type=int)
-        start = (page - 1) * QUESTIONS_PER_PAGE
-        end = start + QUESTIONS_PER_PAGE
-        questions = Question.query.all()
-        if len(questions) == 0:
+        after = request.args.get('after', type=int)
+        # 404 only when there are no questions at all; a page past the
+        # end is an empty page
+        total_questions = count_questions()
+        if total_questions == 0:
             abort(404)
-        formatted_qns = [question.format() for question in questions]
-        categories = []
-        for category in Category.query.all():
-            categories.append(category.type)
-
         return jsonify({
           'success': True,
-          'questions': formatted_qns[start:end],
-          'total_questions': len(questions),
-          'categories': categories,
+          'questions': paginate_questions(Question.query, page, after),
+          'total_questions': total_questions,
+          'categories': category_catalogue.types(),
           'current_category': "All Categories"
           }), 200
 
@@ -158,30 +274,16 @@ def create_app(test_config=None):
         body = request.get_json()
         search_param = body.get("search_term")
         page = request.args.get('page', 1, type=int)
-        start = (page - 1) * QUESTIONS_PER_PAGE
-        end = start + QUESTIONS_PER_PAGE
-        questions = Question.query.join(
-                Category, Category.id == Question.category
-            ).add_columns(Category.type).all()
-        current_questions = [
-            question.Question.format() for question in questions]
-
-        found_questions = []
-        for question in current_questions:
-            if search_param.lower() in question['question'].lower():
-                found_questions.append(question)
+        found_questions, total_questions = search_questions_page(
+            search_param, page)
         if len(found_questions) == 0:
             abort(404)
 
-        categories = []
-        for category in Category.query.all():
-            categories.append(category.type)
-
         return jsonify({
             'success': True,
-            'questions': found_questions[start:end],
-            'total_questions': len(questions),
-            'categories': categories,
+            'questions': found_questions,
+            'total_questions': total_questions,
+            'categories': category_catalogue.types(),
             'current_category': None
         }), 200
 
@@ -197,27 +299,18 @@ def create_app(test_config=None):
     def question_by_category(id):
         """ get questions by category """
         page = request.args.get('page', 1, type=int)
-        start = (page - 1) * QUESTIONS_PER_PAGE
-        end = start + QUESTIONS_PER_PAGE
-        questions = Question.query.filter_by(category=id).join(
-            Category,
-            Category.id == Question.category
-        ).add_columns(Category.type).all()
-        if len(questions) == 0:
+        after = request.args.get('after', type=int)
+        total_questions = count_questions(id)
+        if total_questions == 0:
             abort(404)
-        current_questions = [
-            question.Question.format() for question in questions]
 
-        category = Category.query.filter_by(id=id).first()
-        categories = []
-        for item in Category.query.all():
-            categories.append(item.type)
         return jsonify({
             'success': True,
-            'questions': current_questions[start:end],
-            'total_questions': len(questions),
-            'categories': categories,
-            'current_category': category.type
+            'questions': paginate_questions(
+                Question.query.filter_by(category=id), page, after),
+            'total_questions': total_questions,
+            'categories': category_catalogue.types(),
+            'current_category': category_catalogue.type_of(id)
         }), 200
 
     '''
@@ -235,20 +328,16 @@ def create_app(test_config=None):
     def get_quiz_questions():
         """ Handle querying a random quiz question"""
         body = request.get_json()
-        questions = Question.query.filter_by(
-            category=body.get('quiz_category')['id']
-        ).filter(Question.id.notin_(body.get('previous_questions'))).all()
-
-        if body.get('quiz_category')['id'] == 0:
-            questions = Question.query.filter(
-                Question.id.notin_(body.get('previous_questions'))).all()
-        if len(questions) == 0:
+        quiz_category = body.get('quiz_category') or {}
+        question = random_quiz_question(
+            int(quiz_category.get('id', 0)),
+            body.get('previous_questions') or [])
+        if question is None:
             abort(404)
-        question = random.choice(questions).format()
 
         return jsonify({
             'success': True,
-            'question': question
+            'question': question.format()
         }), 200
 
     '''
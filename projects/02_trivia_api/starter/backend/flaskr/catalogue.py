@@ -0,0 +1,76 @@
+import hashlib
+import json
+import threading
+import time
+
+from sqlalchemy import event
+
+from models import Category
+
+# seconds a loaded catalogue is served before Category is queried again
+CATEGORY_TTL = 300
+
+
+class CategoryCatalogue:
+    """ In-process cache of the category table
+
+    The table is read at most once per `ttl` seconds (and again after
+    invalidate()), so request handlers can list categories without a
+    query. `etag` identifies the cached contents for conditional GETs.
+    """
+
+    def __init__(self, ttl=CATEGORY_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._by_id = {}
+        self._etag = None
+
+    def _current(self):
+        with self._lock:
+            now = self.clock()
+            if self._loaded_at is None or now - self._loaded_at >= self.ttl:
+                self._by_id = {
+                    category.id: category.type
+                    for category in Category.query.order_by(Category.id)}
+                self._etag = hashlib.sha1(json.dumps(
+                    self._by_id, sort_keys=True).encode()).hexdigest()
+                self._loaded_at = now
+            return self._by_id, self._etag
+
+    def invalidate(self):
+        """ Drop the cached categories; the next read reloads them """
+        with self._lock:
+            self._loaded_at = None
+
+    def current(self):
+        """ ({id: type}, etag) from one load, so the two always match """
+        by_id, etag = self._current()
+        return dict(by_id), etag
+
+    def by_id(self):
+        """ {id: type} for every category """
+        return dict(self._current()[0])
+
+    def types(self):
+        """ Category types ordered by id """
+        return list(self._current()[0].values())
+
+    def type_of(self, id):
+        """ The type of category `id`, or None if there is no such category """
+        return self._current()[0].get(id)
+
+    @property
+    def etag(self):
+        return self._current()[1]
+
+
+category_catalogue = CategoryCatalogue()
+
+
+@event.listens_for(Category, 'after_insert')
+@event.listens_for(Category, 'after_update')
+@event.listens_for(Category, 'after_delete')
+def _invalidate_categories(mapper, connection, target):
+    category_catalogue.invalidate()
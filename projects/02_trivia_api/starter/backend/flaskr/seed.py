@@ -0,0 +1,179 @@
+import io
+import itertools
+import os
+import random
+import re
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, select, text
+
+from models import db, create_schema, upgrade_schema, Question, Category
+
+TRIVIA_DUMP = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'trivia.psql')
+COPY_BLOCK = re.compile(
+    r'^COPY public\.(\w+) \((.*?)\) FROM stdin;\n(.*?)^\\\.$', re.M | re.S)
+# rows sent per COPY / executemany round trip
+BATCH_SIZE = 10000
+
+SUBJECTS = {
+    'Science': ['element', 'planet', 'enzyme', 'particle', 'vaccine', 'organ'],
+    'Art': ['painter', 'sculpture', 'fresco', 'portrait', 'movement', 'museum'],
+    'Geography': ['river', 'mountain', 'capital', 'desert', 'island', 'lake'],
+    'History': ['empire', 'treaty', 'dynasty', 'revolution', 'explorer', 'battle'],
+    'Entertainment': ['film', 'album', 'sitcom', 'director', 'musical', 'actor'],
+    'Sports': ['athlete', 'stadium', 'trophy', 'league', 'marathon', 'coach'],
+}
+QUALITIES = ['largest', 'oldest', 'first', 'most famous', 'smallest', 'last',
+             'fastest', 'northernmost', 'earliest', 'tallest', 'longest']
+PLACES = ['Africa', 'Europe', 'Asia', 'South America', 'Oceania', 'Canada',
+          'Japan', 'Egypt', 'Brazil', 'India', 'Italy', 'Mexico', 'Norway']
+ANSWERS = ['Victoria', 'Agra', 'Mercury', 'Brazil', 'Escher', 'Apollo',
+           'Uruguay', 'Carver', 'Scarab', 'Fleming', 'Pollock', 'Angelou']
+
+
+def read_dump(path=TRIVIA_DUMP):
+    """ {table: (columns, rows)} from the COPY blocks of a pg_dump file """
+    tables = {}
+    with open(path) as dump:
+        for table, columns, data in COPY_BLOCK.findall(dump.read()):
+            rows = [tuple(None if value == '\\N' else value
+                          for value in line.split('\t'))
+                    for line in data.splitlines()]
+            tables[table] = (columns.split(', '), rows)
+    return tables
+
+
+def synthetic_questions(count, category_ids, seed=0):
+    """ `count` reproducible (question, answer, difficulty, category) rows
+
+    Questions are built from small vocabularies, so search terms match a
+    predictable share of the corpus.
+    """
+    rng = random.Random(seed)
+    categories = sorted(category_ids.items())
+    for _ in range(count):
+        category_id, category = rng.choice(categories)
+        subjects = SUBJECTS.get(category, SUBJECTS['Science'])
+        yield (
+            'Which {} is the {} {} in {}?'.format(
+                rng.choice(subjects), rng.choice(QUALITIES),
+                rng.choice(subjects), rng.choice(PLACES)),
+            rng.choice(ANSWERS),
+            rng.randint(1, 5),
+            category_id,
+        )
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t') \
+        .replace('\n', '\\n').replace('\r', '\\r')
+
+
+def bulk_load(connection, table, columns, rows, batch_size=BATCH_SIZE):
+    """ Insert `rows` (tuples in `columns` order) into `table`, with COPY on
+    Postgres and executemany batches elsewhere. Returns the row count. """
+    rows = iter(rows)
+    loaded = 0
+    if connection.dialect.name == 'postgresql':
+        cursor = connection.connection.cursor()
+        statement = 'COPY {} ({}) FROM STDIN'.format(
+            table.name, ', '.join(columns))
+    else:
+        insert = table.insert()
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        if connection.dialect.name == 'postgresql':
+            cursor.copy_expert(statement, io.StringIO(''.join(
+                '\t'.join(copy_value(value) for value in row) + '\n'
+                for row in batch)))
+        else:
+            connection.execute(insert, [dict(zip(columns, row)) for row in batch])
+        loaded += len(batch)
+    if connection.dialect.name == 'postgresql':
+        cursor.close()
+        if 'id' in columns:
+            connection.execute(text(
+                "SELECT setval(pg_get_serial_sequence(:table, 'id'),"
+                " (SELECT max(id) FROM {}))".format(table.name)),
+                table=table.name)
+    return loaded
+
+
+def empty_tables(connection):
+    """ Delete every question and category; on Postgres the id sequences
+    restart too, so a reseeded database numbers its rows from 1 again """
+    if connection.dialect.name == 'postgresql':
+        connection.execute('TRUNCATE questions, categories RESTART IDENTITY')
+    else:
+        connection.execute(Question.__table__.delete())
+        connection.execute(Category.__table__.delete())
+
+
+def seed_database(connection, path=TRIVIA_DUMP, questions=None, seed=0):
+    """ Load the categories of `path` and either its questions or
+    `questions` synthetic ones. Returns {table: rows loaded}. """
+    dump = read_dump(path)
+    loaded = {}
+    columns, rows = dump['categories']
+    loaded['categories'] = bulk_load(
+        connection, Category.__table__, columns, rows)
+    if questions is None:
+        columns, rows = dump['questions']
+    else:
+        category_ids = {int(row[columns.index('id')]): row[columns.index('type')]
+                        for row in rows}
+        columns = ['question', 'answer', 'difficulty', 'category']
+        rows = synthetic_questions(questions, category_ids, seed)
+    loaded['questions'] = bulk_load(
+        connection, Question.__table__, columns, rows)
+    if connection.dialect.name == 'postgresql':
+        connection.execute('ANALYZE questions')
+    return loaded
+
+
+@click.command('seed')
+@click.option('--dump', default=TRIVIA_DUMP, show_default=True,
+              type=click.Path(exists=True, dir_okay=False),
+              help='pg_dump file with the categories (and questions) to load.')
+@click.option('--questions', type=click.IntRange(0, None),
+              help='Load this many synthetic questions instead of the '
+                   "dump's, e.g. 1000 up to 10000000.")
+@click.option('--seed', default=0, show_default=True,
+              help='Random seed for the synthetic questions.')
+@click.option('--reset', is_flag=True,
+              help='Delete existing questions and categories first.')
+@with_appcontext
+def seed_command(dump, questions, seed, reset):
+    """ Bulk load categories and questions. """
+    create_schema()
+    with db.engine.begin() as connection:
+        existing = connection.execute(
+            select([func.count()]).select_from(Category.__table__)).scalar()
+        if existing and not reset:
+            raise click.ClickException(
+                'The database already has categories; pass --reset to '
+                'replace them.')
+        if reset:
+            empty_tables(connection)
+        start = time.perf_counter()
+        loaded = seed_database(connection, dump, questions, seed)
+    elapsed = time.perf_counter() - start
+    for table, count in loaded.items():
+        click.echo('{:>10} {}'.format(count, table))
+    click.echo('loaded in {:.1f}s'.format(elapsed))
+
+
+@click.command('upgrade-schema')
+@with_appcontext
+def upgrade_schema_command():
+    """ Add the full-text search column to an older questions table. """
+    with db.engine.begin() as connection:
+        upgrade_schema(connection)
+    click.echo('schema is up to date')
@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+
+import click
+
+# run in a fresh interpreter so every import is cold; timings go to stdout
+# as json, `-X importtime` writes its per-module report to stderr
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import flaskr
+imported = time.perf_counter()
+app = flaskr.create_app()
+created = time.perf_counter()
+response = app.test_client().get(sys.argv[1])
+response.get_data()
+served = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'factory': created - imported,
+    'first_request': served - created,
+    'status': response.status_code,
+}))
+'''
+
+
+def parse_importtime(report):
+    """ [(module, self seconds, cumulative seconds)] from `-X importtime` """
+    modules = []
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, module = line[len('import time:'):].split('|')
+        modules.append((module.strip(), int(own) / 1e6, int(cumulative) / 1e6))
+    return modules
+
+
+def profile_startup(path='/categories'):
+    """ Import, create_app() and first-request timings of a cold start,
+    plus the per-module import report """
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    probe = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE, path],
+        cwd=backend, env=dict(os.environ, PYTHONPATH=backend),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    if probe.returncode:
+        raise click.ClickException(probe.stderr.splitlines()[-1])
+    timings = json.loads(probe.stdout.splitlines()[-1])
+    return timings, parse_importtime(probe.stderr)
+
+
+@click.command('startup-profile')
+@click.option('--path', default='/categories', show_default=True,
+              help='URL fetched as the first request.')
+@click.option('--top', default=15, show_default=True,
+              help='Number of slowest imports to list.')
+def startup_profile(path, top):
+    """ Time a cold start: imports, create_app() and the first request. """
+    timings, modules = profile_startup(path)
+    click.echo('import flaskr      {:8.1f} ms'.format(timings['import'] * 1e3))
+    click.echo('create_app()       {:8.1f} ms'.format(timings['factory'] * 1e3))
+    click.echo('first request      {:8.1f} ms  (GET {} -> {})'.format(
+        timings['first_request'] * 1e3, path, timings['status']))
+    click.echo('\nslowest imports (cumulative / self ms)')
+    for module, own, cumulative in sorted(
+            modules, key=lambda module: module[2], reverse=True)[:top]:
+        click.echo('  {:<40} {:8.1f} {:8.1f}'.format(
+            module, cumulative * 1e3, own * 1e3))
@@ -1,5 +1,7 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, Index, DDL, create_engine, event, inspect
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -12,16 +14,51 @@ database_path = "postgresql://postgres:{}@{}:{}/{}".format(
 
 db = SQLAlchemy()
 
+'''
+schema_setup()
+    how setup_db() puts the tables in place, read from SCHEMA_SETUP:
+    'create'      db.create_all() inside setup_db(), the default; it only
+                  creates the tables that are missing, so a fresh database
+                  works without any other step
+    'lazy'        db.create_all() before the first request instead; app
+                  creation gets faster, but every worker still pays for
+                  the check once, on its first request
+    'migrations'  never; the opt-out for databases whose schema is put in
+                  place by hand (restoring trivia.psql), which saves the
+                  startup round trips
+'''
+SCHEMA_SETUPS = ('create', 'lazy', 'migrations')
+
+def schema_setup():
+    return os.environ.get('SCHEMA_SETUP', 'create')
+
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
 '''
-def setup_db(app, database_path=database_path):
+def setup_db(app, database_path=database_path, schema=None):
+    schema = schema or schema_setup()
+    if schema not in SCHEMA_SETUPS:
+        raise ValueError('SCHEMA_SETUP must be one of {}, not {!r}'.format(
+            ', '.join(SCHEMA_SETUPS), schema))
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     db.app = app
     db.init_app(app)
+    if schema == 'create':
+        create_schema()
+    elif schema == 'lazy':
+        app.before_first_request(create_schema)
+
+'''
+create_schema()
+    creates the missing tables and brings existing ones up to date
+    (see upgrade_schema())
+'''
+def create_schema():
     db.create_all()
+    with db.engine.begin() as connection:
+        upgrade_schema(connection)
 
 '''
 Question
@@ -33,8 +70,14 @@ class Question(db.Model):
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(Integer)
+  category = Column(Integer, index=True)
   difficulty = Column(Integer)
+  # full-text index of `question`, kept up to date by a trigger on PostgreSQL
+  search_vector = deferred(Column(TSVECTOR().with_variant(String, 'sqlite')))
+
+  __table_args__ = (
+    Index('ix_questions_search_vector', 'search_vector', postgresql_using='gin'),
+  )
 
   def __init__(self, question, answer, category, difficulty):
     self.question = question
@@ -62,6 +105,44 @@ class Question(db.Model):
       'difficulty': self.difficulty
     }
 
+SEARCH_VECTOR_TRIGGER = (
+  "CREATE TRIGGER questions_search_vector_update"
+  " BEFORE INSERT OR UPDATE ON questions FOR EACH ROW"
+  " EXECUTE PROCEDURE tsvector_update_trigger("
+  "'search_vector', 'pg_catalog.english', 'question')")
+
+event.listen(Question.__table__, 'after_create',
+  DDL(SEARCH_VECTOR_TRIGGER).execute_if(dialect='postgresql'))
+
+'''
+upgrade_schema(connection)
+    adds what a questions table created before full-text search lacks on
+    PostgreSQL: the search_vector column, its GIN index and trigger, and
+    the vectors of the rows already there
+    a no-op once the column exists; workers that start together queue on
+    the ALTER TABLE lock and find the work done
+'''
+SEARCH_VECTOR_UPGRADE = (
+  "ALTER TABLE questions ADD COLUMN IF NOT EXISTS search_vector tsvector",
+  "UPDATE questions SET search_vector ="
+  " to_tsvector('pg_catalog.english', coalesce(question, ''))"
+  " WHERE search_vector IS NULL",
+  "CREATE INDEX IF NOT EXISTS ix_questions_search_vector"
+  " ON questions USING gin (search_vector)",
+  "DROP TRIGGER IF EXISTS questions_search_vector_update ON questions",
+  SEARCH_VECTOR_TRIGGER,
+)
+
+def upgrade_schema(connection):
+  if connection.dialect.name != 'postgresql' \
+      or not connection.dialect.has_table(connection, 'questions'):
+    return
+  columns = [column['name'] for column in inspect(connection).get_columns('questions')]
+  if 'search_vector' in columns:
+    return
+  for statement in SEARCH_VECTOR_UPGRADE:
+    connection.execute(statement)
+
 '''
 Category
 
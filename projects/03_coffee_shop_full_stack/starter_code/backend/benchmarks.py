@@ -0,0 +1,295 @@
+'''
+Benchmarks for the coffee shop backend.
+
+    python benchmarks.py [--requests 2000] [--drinks 10000] [--seconds 5]
+
+Tokens are signed with a throwaway RSA key whose JWKS is served from a
+local HTTP server, so no Auth0 tenant is needed. Drinks are loaded into
+a throwaway SQLite file.
+'''
+import argparse
+import base64
+import gc
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from Crypto.PublicKey import RSA
+from flask import Flask, jsonify
+from jose import jwt
+from sqlalchemy import Column, Integer, String, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.declarative import declarative_base
+
+from src.auth import auth
+from src.auth.jwks import JWKSKeyStore
+from src.database.models import (
+    db, setup_db, Drink, sqlite_pragmas, sqlite_engine_options)
+
+KID = 'benchmark'
+
+
+def b64_uint(value):
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def jwks_server(key):
+    """ Serve `key`'s public half as a JWKS document on a free local port """
+    body = json.dumps({'keys': [{
+        'kty': 'RSA', 'kid': KID, 'use': 'sig', 'alg': 'RS256',
+        'n': b64_uint(key.n), 'e': b64_uint(key.e)}]}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def barista_token(key):
+    now = int(time.time())
+    return jwt.encode({
+        'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+        'aud': auth.API_AUDIENCE,
+        'sub': 'auth0|barista',
+        'iat': now,
+        'exp': now + 3600,
+        'permissions': ['get:drinks-detail'],
+    }, key.export_key().decode(), algorithm='RS256', headers={'kid': KID})
+
+
+def detail_app():
+    app = Flask(__name__)
+
+    @app.route('/drinks-detail')
+    @auth.requires_auth('get:drinks-detail')
+    def drinks_detail(payload):
+        return jsonify({'success': True, 'drinks': []})
+
+    return app
+
+
+def requests_per_second(client, token, requests):
+    headers = {'Authorization': 'Bearer ' + token}
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get('/drinks-detail', headers=headers)
+        assert response.status_code == 200, response.data
+    return requests / (time.perf_counter() - start)
+
+
+def bench_requires_auth(requests=2000):
+    """ /drinks-detail requests per second with one bearer token,
+    re-verifying every request vs the verified-token cache """
+    key = RSA.generate(2048)
+    server = jwks_server(key)
+    signing_keys = auth.signing_keys
+    auth.signing_keys = JWKSKeyStore(
+        'http://127.0.0.1:{}/.well-known/jwks.json'.format(server.server_port),
+        background=False)
+    token = barista_token(key)
+    client = detail_app().test_client()
+    try:
+        auth.verified_tokens = auth.TokenCache(maxsize=0)
+        uncached = requests_per_second(client, token, requests)
+        auth.verified_tokens = auth.TokenCache()
+        cached = requests_per_second(client, token, requests)
+    finally:
+        server.shutdown()
+        auth.signing_keys = signing_keys
+    return uncached, cached
+
+
+class LegacyDrink(declarative_base()):
+    # Drink as it was before the JSON column: recipe is a string that
+    # short() parses twice (once for a debug print) and long() once more
+    __tablename__ = 'drink'
+    id = Column(Integer, primary_key=True)
+    title = Column(String(80))
+    recipe = Column(String(180))
+
+    def short(self):
+        json.loads(self.recipe)
+        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
+        return {'id': self.id, 'title': self.title, 'recipe': short_recipe}
+
+    def long(self):
+        return {'id': self.id, 'title': self.title, 'recipe': json.loads(self.recipe)}
+
+
+def load_drinks(size, seed=0):
+    rng = random.Random(seed)
+    colors = ['brown', 'white', 'grey', 'black', 'blue']
+    db.session.execute(Drink.__table__.insert(), [{
+        'title': 'Drink {}'.format(i),
+        'recipe': [{'name': 'Ingredient {}'.format(part),
+                    'color': rng.choice(colors),
+                    'parts': rng.randint(1, 3)}
+                   for part in range(rng.randint(1, 4))]
+    } for i in range(size)])
+    db.session.commit()
+
+
+def timed_listing(model, session, rounds):
+    """ Average seconds per round to load every drink, then to serialize
+    the /drinks (short) and /drinks-detail (long) listings from them """
+    load = serialize = 0
+    # like timeit, keep collector pauses out of the measurement
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            drinks = session.query(model).all()
+            loaded = time.perf_counter()
+            json.dumps([drink.short() for drink in drinks])
+            json.dumps([drink.long() for drink in drinks])
+            serialize += time.perf_counter() - loaded
+            load += loaded - start
+            session.expunge_all()
+    finally:
+        gc.enable()
+    return load / rounds, serialize / rounds
+
+
+def bench_drink_serialization(size=10000, rounds=5):
+    """ (load, serialize) seconds for `size` drinks with the string recipe
+    and with the JSON column """
+    with tempfile.TemporaryDirectory() as directory:
+        app = Flask(__name__)
+        setup_db(app, 'sqlite:///{}'.format(
+            os.path.join(directory, 'database.db')))
+        with app.app_context():
+            db.create_all()
+            load_drinks(size)
+            legacy = timed_listing(LegacyDrink, db.session, rounds)
+            current = timed_listing(Drink, db.session, rounds)
+            db.session.remove()
+            db.get_engine(app).dispose()
+    return legacy, current
+
+
+# setup_db() overrides that turn the sqlite profile off again: rollback
+# journal, full sync, no mmap, pysqlite's busy timeout, no pooling
+UNTUNED = (
+    {name: None for name in sqlite_pragmas},
+    {name: None for name in sqlite_engine_options},
+)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0
+
+
+def read_menu(engine, stop, latencies, errors):
+    query = select([Drink.__table__]).order_by(Drink.id.desc()).limit(50)
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            with engine.connect() as connection:
+                connection.execute(query).fetchall()
+        except OperationalError:
+            errors.append('read')
+        latencies.append(time.perf_counter() - start)
+
+
+def write_drinks(engine, stop, writer, commits, errors, batch=200):
+    insert = Drink.__table__.insert()
+    for round in itertools.count():
+        if stop.is_set():
+            break
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert, [{
+                    'title': 'Drink {}-{}-{}'.format(writer, round, i),
+                    'recipe': [{'name': 'Water', 'color': 'blue', 'parts': 1}]
+                } for i in range(batch)])
+            commits.append(round)
+        except OperationalError:
+            errors.append('write')
+
+
+def bench_sqlite_concurrency(seconds=5, readers=4, writers=2):
+    """ Reader latency and failures while writers commit continuously,
+    without and with the sqlite profile """
+    results = []
+    for label, (pragmas, engine_options) in (
+            ('untuned', UNTUNED), ('profile', (None, None))):
+        with tempfile.TemporaryDirectory() as directory:
+            app = Flask(__name__)
+            setup_db(app, 'sqlite:///{}'.format(
+                os.path.join(directory, 'database.db')), pragmas, engine_options)
+            with app.app_context():
+                db.create_all()
+                load_drinks(1000)
+                engine = db.engine
+                stop = threading.Event()
+                latencies, commits, errors = [], [], []
+                threads = [threading.Thread(
+                    target=read_menu, args=(engine, stop, latencies, errors))
+                    for _ in range(readers)]
+                threads += [threading.Thread(
+                    target=write_drinks,
+                    args=(engine, stop, writer, commits, errors))
+                    for writer in range(writers)]
+                for thread in threads:
+                    thread.start()
+                time.sleep(seconds)
+                stop.set()
+                for thread in threads:
+                    thread.join()
+                db.session.remove()
+                engine.dispose()
+        results.append((label, {
+            'reads': len(latencies) / seconds,
+            'p50': percentile(latencies, 0.5),
+            'p99': percentile(latencies, 0.99),
+            'max': max(latencies, default=0),
+            'commits': len(commits) / seconds,
+            'errors': len(errors),
+        }))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--drinks', type=int, default=10000)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    uncached, cached = bench_requires_auth(args.requests)
+    print('requires_auth, {} requests  uncached {:8.1f} req/s'
+          '  cached {:8.1f} req/s  speedup {:5.1f}x'.format(
+              args.requests, uncached, cached, cached / uncached))
+
+    legacy, current = bench_drink_serialization(args.drinks)
+    for label, before, after in zip(('load', 'serialize'), legacy, current):
+        print('drink listing, {} drinks {:<9} legacy {:8.4f}s'
+              '  current {:8.4f}s  speedup {:5.1f}x'.format(
+                  args.drinks, label, before, after, before / after))
+
+    for label, result in bench_sqlite_concurrency(args.seconds):
+        print('sqlite 4 readers + 2 writers, {:<8} reads {reads:8.1f}/s'
+              '  p50 {p50:7.4f}s  p99 {p99:7.4f}s  max {max:7.4f}s'
+              '  commits {commits:6.1f}/s  locked errors {errors}'.format(
+                  label, **result))
+
+
+if __name__ == '__main__':
+    main()
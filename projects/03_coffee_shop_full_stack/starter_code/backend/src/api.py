@@ -4,13 +4,17 @@ from sqlalchemy import exc
 import json
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import db_drop_and_create_all, setup_db, Drink, drinks_version
 from .auth.auth import AuthError, requires_auth
+from .cache import ResponseCache
 
 app = Flask(__name__)
 setup_db(app)
 CORS(app)
 
+# serialized GET /drinks menu, rebuilt only after Drink.insert/update/delete
+menu_cache = ResponseCache(drinks_version)
+
 '''
 @TODO uncomment the following line to initialize the datbase
 !! NOTE THIS WILL DROP ALL RECORDS AND START YOUR DB FROM SCRATCH
@@ -27,6 +31,12 @@ CORS(app)
     returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
         or appropriate status code indicating reason for failure
 '''
+@app.route('/drinks')
+def get_drinks():
+    return menu_cache.respond('drinks', lambda: {
+        'success': True,
+        'drinks': [drink.short() for drink in Drink.query.order_by(Drink.id).all()]
+    })
 
 
 '''
@@ -0,0 +1,143 @@
+# Vendored copy of BasicFlaskAuth/jwks.py, which is where it is tested
+# (test_jwks.py). The projects are installed separately, so the coffee shop
+# keeps its own copy; change BasicFlaskAuth/jwks.py first and copy it here.
+# src/auth/test_auth.py checks that the two stay identical.
+
+import json
+import re
+import threading
+import time
+from urllib.request import urlopen
+
+# used when the JWKS response carries no Cache-Control max-age
+DEFAULT_MAX_AGE = 600
+# an unknown kid triggers at most one refetch per this many seconds
+MIN_REFETCH_INTERVAL = 30
+# refresh this many seconds before the cached keys expire
+REFRESH_MARGIN = 30
+# wait between background retries after a failed refresh
+RETRY_INTERVAL = 15
+
+MAX_AGE = re.compile(r'(?:^|,)\s*max-age\s*=\s*"?(\d+)"?', re.IGNORECASE)
+KEY_FIELDS = ('kty', 'kid', 'use', 'n', 'e')
+
+
+def cache_max_age(cache_control, default=DEFAULT_MAX_AGE):
+    """Seconds a response may be cached according to its Cache-Control header
+    """
+    if cache_control:
+        if re.search(r'no-cache|no-store', cache_control, re.IGNORECASE):
+            return 0
+        match = MAX_AGE.search(cache_control)
+        if match:
+            return int(match.group(1))
+    return default
+
+
+class JWKSKeyStore:
+    """Signing keys from a JWKS endpoint, indexed by kid
+
+    The key set is fetched on first use and then kept fresh by a daemon
+    thread that refetches shortly before the Cache-Control max-age runs
+    out, so request handlers never wait on the identity provider. If a
+    refresh fails the previous keys keep being served. A kid that is not
+    in the set (the provider rotated its keys early) causes one
+    synchronous refetch, rate limited to one per `min_refetch_interval`.
+    """
+
+    def __init__(self, url, timeout=5, default_max_age=DEFAULT_MAX_AGE,
+                 min_refetch_interval=MIN_REFETCH_INTERVAL,
+                 refresh_margin=REFRESH_MARGIN, retry_interval=RETRY_INTERVAL,
+                 background=True, clock=time.monotonic):
+        self.url = url
+        self.timeout = timeout
+        self.default_max_age = default_max_age
+        self.min_refetch_interval = min_refetch_interval
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.background = background
+        self.clock = clock
+        self.fetched_at = None
+        self.expires_at = None
+        self._keys = {}
+        self._missed_at = float('-inf')
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def fetch(self):
+        """Fetch the key set now, replacing the cached keys
+        """
+        with urlopen(self.url, timeout=self.timeout) as response:
+            jwks = json.loads(response.read())
+            max_age = cache_max_age(
+                response.headers.get('Cache-Control'), self.default_max_age)
+        keys = {}
+        for key in jwks.get('keys', []):
+            if 'kid' in key:
+                keys[key['kid']] = {
+                    field: key[field] for field in KEY_FIELDS if field in key}
+        now = self.clock()
+        self._keys = keys
+        self.fetched_at = now
+        self.expires_at = now + max_age
+
+    def get_key(self, kid):
+        """The RSA key for `kid`, or None if the provider does not publish it
+        """
+        if self.fetched_at is None:
+            with self._lock:
+                if self.fetched_at is None:
+                    self.fetch()
+            self._start()
+
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+
+        with self._lock:
+            key = self._keys.get(kid)
+            now = self.clock()
+            if key is None and (now - max(self.fetched_at, self._missed_at)
+                                >= self.min_refetch_interval):
+                self._missed_at = now
+                try:
+                    self.fetch()
+                except Exception:
+                    # the provider is down; keep serving the keys we have
+                    return None
+                key = self._keys.get(kid)
+        return key
+
+    def stop(self):
+        """Stop the background refresh thread
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _start(self):
+        with self._lock:
+            if self.background and self._thread is None:
+                self._stopped.clear()
+                self._thread = threading.Thread(
+                    target=self._refresh_loop, name='jwks-refresh',
+                    daemon=True)
+                self._thread.start()
+
+    def _refresh_loop(self):
+        delay = self._until_refresh()
+        while not self._stopped.wait(delay):
+            try:
+                with self._lock:
+                    self.fetch()
+            except Exception:
+                delay = self.retry_interval
+            else:
+                delay = self._until_refresh()
+
+    def _until_refresh(self):
+        # never spin: a max-age of 0 still waits for the refetch interval
+        return max(self.expires_at - self.refresh_margin - self.clock(),
+                   self.min_refetch_interval)
@@ -0,0 +1,160 @@
+import os
+import unittest
+from unittest import mock
+
+from flask import Flask
+from jose import jwt
+
+from . import auth
+from .auth import AuthError, TokenCache, get_token_auth_header, verify_token
+from .jwks import JWKSKeyStore
+
+
+class Clock:
+    """A clock the test moves by hand"""
+
+    def __init__(self, now=1000):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TokenCacheTestCase(unittest.TestCase):
+    """This class represents the verified token cache test case"""
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = TokenCache(maxsize=2, clock=self.clock)
+
+    def payload(self, exp=2000):
+        return {'exp': exp, 'permissions': ['get:drinks-detail']}
+
+    def test_hit_returns_payload_and_permissions(self):
+        payload = self.payload()
+        permissions = frozenset(payload['permissions'])
+        self.cache.put('token', payload, permissions)
+
+        self.assertEqual(self.cache.get('token'), (payload, permissions))
+        self.assertIsNone(self.cache.get('other token'))
+
+    def test_entry_expires_at_exp(self):
+        self.cache.put('token', self.payload(exp=2000), frozenset())
+
+        self.clock.now = 1999.5
+        self.assertIsNotNone(self.cache.get('token'))
+        self.clock.now = 2000
+        self.assertIsNone(self.cache.get('token'))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_token_without_exp_is_not_cached(self):
+        self.cache.put('token', {'permissions': []}, frozenset())
+
+        self.assertIsNone(self.cache.get('token'))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.put('first', self.payload(), frozenset())
+        self.cache.put('second', self.payload(), frozenset())
+        # reading `first` makes `second` the least recently used
+        self.cache.get('first')
+        self.cache.put('third', self.payload(), frozenset())
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNotNone(self.cache.get('first'))
+        self.assertIsNone(self.cache.get('second'))
+        self.assertIsNotNone(self.cache.get('third'))
+
+    def test_verify_token_decodes_once_per_token(self):
+        payload = self.payload(exp=4102444800)
+        with mock.patch.object(auth, 'verified_tokens', TokenCache()), \
+                mock.patch.object(auth, 'verify_decode_jwt',
+                                  return_value=payload) as verify_decode_jwt:
+            verify_token('token')
+            self.assertEqual(verify_token('token'),
+                             (payload, frozenset(['get:drinks-detail'])))
+
+        verify_decode_jwt.assert_called_once_with('token')
+
+
+class AuthHeaderTestCase(unittest.TestCase):
+    """This class represents the Authorization header test case"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+
+    def token_from(self, header):
+        headers = {} if header is None else {'Authorization': header}
+        with self.app.test_request_context(headers=headers):
+            return get_token_auth_header()
+
+    def assertRejected(self, header, code):
+        with self.assertRaises(AuthError) as raised:
+            self.token_from(header)
+        self.assertEqual(raised.exception.status_code, 401)
+        self.assertEqual(raised.exception.error['code'], code)
+
+    def test_bearer_token(self):
+        self.assertEqual(self.token_from('Bearer abc.def.ghi'), 'abc.def.ghi')
+
+    def test_missing_blank_and_whitespace_headers(self):
+        for header in (None, '', '   '):
+            self.assertRejected(header, 'authorization_header_missing')
+
+    def test_malformed_headers(self):
+        for header in ('Basic abc', 'Bearer', 'Bearer abc def'):
+            self.assertRejected(header, 'invalid_header')
+
+
+class SigningKeyTestCase(unittest.TestCase):
+    """This class represents the signing key lookup test case"""
+
+    def test_unknown_kid_is_looked_up_in_the_key_store(self):
+        token = jwt.encode({'sub': 'user'}, 'secret', algorithm='HS256',
+                           headers={'kid': 'rotated'})
+        with mock.patch.object(auth.signing_keys, 'get_key',
+                               return_value=None) as get_key:
+            with self.assertRaises(AuthError) as raised:
+                auth.verify_decode_jwt(token)
+
+        get_key.assert_called_once_with('rotated')
+        self.assertEqual(raised.exception.error['code'], 'invalid_header')
+
+    def test_malformed_token_is_unauthorized(self):
+        for token in ('garbage', 'a.b.c', ''):
+            with self.assertRaises(AuthError) as raised:
+                auth.verify_decode_jwt(token)
+            self.assertEqual(raised.exception.status_code, 401)
+
+    def test_failed_key_fetch_is_unauthorized(self):
+        token = jwt.encode({'sub': 'user'}, 'secret', algorithm='HS256',
+                           headers={'kid': 'first'})
+        store = JWKSKeyStore('http://127.0.0.1:9/.well-known/jwks.json',
+                             timeout=1, background=False)
+        with mock.patch.object(auth, 'signing_keys', store):
+            with self.assertRaises(AuthError) as raised:
+                auth.verify_decode_jwt(token)
+
+        self.assertEqual(raised.exception.status_code, 401)
+        self.assertEqual(raised.exception.error['description'],
+                         'Unable to fetch the signing keys.')
+
+
+class VendoredJWKSTestCase(unittest.TestCase):
+    """This class represents the vendored key store test case"""
+
+    def test_matches_basic_flask_auth(self):
+        here = os.path.dirname(os.path.abspath(__file__))
+        original = os.path.join(
+            here, *[os.pardir] * 6, 'BasicFlaskAuth', 'jwks.py')
+        if not os.path.exists(original):
+            self.skipTest('BasicFlaskAuth is not checked out next to this project')
+        with open(os.path.join(here, 'jwks.py')) as vendored, \
+                open(original) as source:
+            # everything after the comment naming the source
+            copy = vendored.read().split('\n\n', 1)[1]
+            self.assertEqual(copy, source.read())
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
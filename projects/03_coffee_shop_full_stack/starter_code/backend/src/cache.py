@@ -0,0 +1,54 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timezone
+from flask import Response, request
+
+'''
+ResponseCache
+    keeps serialized JSON response bodies together with their ETag and
+    Last-Modified for as long as `version` (see DataVersion) does not move
+    respond() answers If-None-Match / If-Modified-Since with a 304 and
+    only calls `build` when the cached body is missing or stale
+    EXAMPLE
+        menu_cache = ResponseCache(drinks_version)
+        return menu_cache.respond('drinks', lambda: {'drinks': ...})
+'''
+class ResponseCache:
+    def __init__(self, version):
+        self.version = version
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def entry(self, key, build):
+        version = self.version.value
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry
+        with self._lock:
+            version = self.version.value
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                # tag with the version read before building; a write that
+                # lands while we build leaves the entry already stale
+                body = json.dumps(build()).encode()
+                etag = hashlib.sha1(body).hexdigest()
+                last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+                if entry is not None and entry[2] == etag:
+                    last_modified = entry[3]
+                entry = (version, body, etag, last_modified)
+                self._entries[key] = entry
+        return entry
+
+    def respond(self, key, build):
+        version, body, etag, last_modified = self.entry(key, build)
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        # clients may keep the body but must revalidate it on every use
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -1,23 +1,167 @@
+import hashlib
 import os
-from sqlalchemy import Column, String, Integer
+import tempfile
+import threading
+import uuid
+from sqlalchemy import Column, String, Integer, JSON, event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.mutable import MutableList
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import validates
 from flask_sqlalchemy import SQLAlchemy
 import json
 
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
-database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filename))
+database_path = os.environ.get(
+    'DATABASE_URL',
+    "sqlite:///{}".format(os.path.join(project_dir, database_filename)))
 
 db = SQLAlchemy()
 
+'''
+sqlite profile
+    pragmas run on every new SQLite connection, and the engine options
+    used with them; pass overrides to setup_db(), a None value drops a
+    pragma or option
+    WAL lets readers carry on while a writer commits, NORMAL sync is safe
+    with WAL (a crash can lose the last commits, never corrupt the file),
+    busy_timeout makes writers queue instead of failing with
+    "database is locked"
+'''
+sqlite_pragmas = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000
+}
+sqlite_engine_options = {
+    # keep connections (and their pragmas and page cache) between requests
+    'poolclass': QueuePool,
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+    # a pooled connection may be checked out by any request thread
+    'connect_args': {'check_same_thread': False}
+}
+
+'''
+DataVersion
+    a counter that moves on every write to the drinks table
+    bump() also replaces a small stamp file (see version_path()), so every
+    worker process notices writes made by the others with a stat() call
+    and without querying the database
+    use() points the counter at another stamp file, e.g. when setup_db()
+    binds a different database
+'''
+class DataVersion:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._value = 0
+        self._stamp = self._read_stamp()
+
+    def use(self, path):
+        with self._lock:
+            if path == self.path:
+                return
+            self.path = path
+            self._stamp = self._read_stamp()
+            # whatever was cached came from the other database
+            self._value += 1
+
+    def _read_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def bump(self):
+        # one temporary file per write: threads of a worker bump concurrently
+        token = uuid.uuid4().hex
+        temporary = '{}.{}.tmp'.format(self.path, token)
+        with open(temporary, 'w') as stamp:
+            stamp.write(token)
+        os.replace(temporary, self.path)
+        with self._lock:
+            self._value += 1
+            self._stamp = self._read_stamp()
+
+    @property
+    def value(self):
+        stamp = self._read_stamp()
+        with self._lock:
+            if stamp != self._stamp:
+                self._value += 1
+                self._stamp = stamp
+            return self._value
+
+
+'''
+sqlite_file(database_path)
+    the absolute path of the file behind a SQLite url, or None for other
+    databases and in-memory SQLite
+'''
+def sqlite_file(database_path):
+    url = make_url(database_path)
+    if url.drivername.startswith('sqlite') and url.database not in (None, '', ':memory:'):
+        return os.path.abspath(url.database)
+    return None
+
+'''
+version_path(database_path)
+    the stamp file for a database: `<file>.version` next to a SQLite file;
+    for other databases (and in-memory SQLite) a file in the temp directory
+    named after the url, which processes on the same host share
+'''
+def version_path(database_path):
+    path = sqlite_file(database_path)
+    if path is not None:
+        return path + '.version'
+    digest = hashlib.sha1(str(make_url(database_path)).encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), 'drinks-{}.version'.format(digest))
+
+
+drinks_version = DataVersion(version_path(database_path))
+
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    SQLite files get the sqlite profile above, with `pragmas` and
+    `engine_options` overriding single entries; in-memory SQLite keeps
+    Flask-SQLAlchemy's single shared connection, since every pooled
+    connection would open a new, empty database
+    drinks_version follows the database to its stamp file
 '''
-def setup_db(app):
+def setup_db(app, database_path=database_path, pragmas=None, engine_options=None):
+    drinks_version.use(version_path(database_path))
+    pragmas = without_none({**sqlite_pragmas, **(pragmas or {})})
+    engine_options = without_none({**sqlite_engine_options, **(engine_options or {})})
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    sqlite_profile = sqlite_file(database_path) is not None
+    if sqlite_profile:
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
     db.app = app
     db.init_app(app)
+    if sqlite_profile and pragmas:
+        with app.app_context():
+            event.listen(db.engine, 'connect', apply_pragmas(pragmas))
+
+
+def without_none(options):
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def apply_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+        cursor.close()
+    return on_connect
 
 '''
 db_drop_and_create_all()
@@ -28,6 +172,7 @@ db_drop_and_create_all()
 def db_drop_and_create_all():
     db.drop_all()
     db.create_all()
+    drinks_version.bump()
 
 '''
 Drink
@@ -40,31 +185,66 @@ class Drink(db.Model):
     title = Column(String(80), unique=True)
     # the ingredients blob - this stores a lazy json blob
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
-    recipe =  Column(String(180), nullable=False)
+    # JSONB on postgres, a JSON text column elsewhere; either way the
+    # column type parses it once when the row is loaded
+    # MutableList tracks changes to the list itself (append, remove, ...);
+    # changes inside one ingredient are not seen, assign a new recipe instead
+    recipe = Column(MutableList.as_mutable(JSON().with_variant(JSONB, 'postgresql')),
+                    nullable=False)
+
+    # (short, long) representations, built on first use and rebuilt by
+    # insert() / update() or whenever title or recipe is assigned or the
+    # recipe list is changed in place
+    _projections = None
+
+    @validates('recipe')
+    def validate_recipe(self, key, recipe):
+        self._projections = None
+        # accept the json strings older callers pass, and a single ingredient
+        if isinstance(recipe, str):
+            recipe = json.loads(recipe)
+        if isinstance(recipe, dict):
+            recipe = [recipe]
+        return recipe
+
+    @validates('title')
+    def validate_title(self, key, title):
+        self._projections = None
+        return title
+
+    '''
+    refresh_projections()
+        rebuilds the cached short() and long() representations
+    '''
+    def refresh_projections(self):
+        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in self.recipe]
+        self._projections = (
+            {'id': self.id, 'title': self.title, 'recipe': short_recipe},
+            {'id': self.id, 'title': self.title, 'recipe': [dict(r) for r in self.recipe]}
+        )
+        return self._projections
+
+    @staticmethod
+    def _copy_projection(projection):
+        # callers get their own dicts, so changing one leaves the cache intact
+        return {'id': projection['id'], 'title': projection['title'],
+                'recipe': [dict(r) for r in projection['recipe']]}
 
     '''
     short()
         short form representation of the Drink model
+        returns a copy of the cached representation
     '''
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': short_recipe
-        }
+        return self._copy_projection((self._projections or self.refresh_projections())[0])
 
     '''
     long()
         long form representation of the Drink model
+        returns a copy of the cached representation
     '''
     def long(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': json.loads(self.recipe)
-        }
+        return self._copy_projection((self._projections or self.refresh_projections())[1])
 
     '''
     insert()
@@ -77,7 +257,10 @@ class Drink(db.Model):
     '''
     def insert(self):
         db.session.add(self)
+        db.session.flush()
+        self.refresh_projections()
         db.session.commit()
+        drinks_version.bump()
 
     '''
     delete()
@@ -90,6 +273,7 @@ class Drink(db.Model):
     def delete(self):
         db.session.delete(self)
         db.session.commit()
+        drinks_version.bump()
 
     '''
     update()
@@ -101,7 +285,22 @@ class Drink(db.Model):
             drink.update()
     '''
     def update(self):
+        db.session.flush()
+        self.refresh_projections()
         db.session.commit()
+        drinks_version.bump()
 
     def __repr__(self):
-        return json.dumps(self.short())
\ No newline at end of file
+        return json.dumps(self.short())
+
+
+@event.listens_for(Drink, 'refresh')
+def discard_projections(target, context, attrs):
+    # the row was reloaded from the database; rebuild on next use
+    target._projections = None
+
+
+@event.listens_for(Drink.recipe, 'modified')
+def discard_modified_projections(target, initiator):
+    # the recipe list was changed in place (see MutableList above)
+    target._projections = None
@@ -0,0 +1,174 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from flask import Flask
+from sqlalchemy.pool import QueuePool
+
+# keep the tests off database.db, whichever test module is imported first
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL', 'sqlite:///{}'.format(
+    os.path.join(tempfile.gettempdir(), 'coffee_shop_test.db')))
+os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+
+from .models import (db, setup_db, sqlite_file, db_drop_and_create_all,
+                     DataVersion, Drink)
+
+
+class DataVersionTestCase(unittest.TestCase):
+    """This class represents the drinks version stamp test case"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'drinks.db.version')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_bump_is_seen_by_other_processes(self):
+        version = DataVersion(self.path)
+        other = DataVersion(self.path)
+        before = other.value
+
+        version.bump()
+
+        self.assertGreater(other.value, before)
+
+    def test_concurrent_bumps(self):
+        version = DataVersion(self.path)
+        errors = []
+
+        def bump():
+            try:
+                for _ in range(10):
+                    version.bump()
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=bump) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertGreaterEqual(version.value, 80)
+        self.assertEqual(os.listdir(self.directory.name), ['drinks.db.version'])
+
+
+WATER = {'name': 'water', 'color': 'blue', 'parts': 1}
+MILK = {'name': 'milk', 'color': 'white', 'parts': 2}
+
+
+class DrinkTestCase(unittest.TestCase):
+    """This class represents the drink model test case"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = Flask(__name__)
+        setup_db(cls.app, TEST_DATABASE_URL)
+
+    def setUp(self):
+        self.context = self.app.app_context()
+        self.context.push()
+        db_drop_and_create_all()
+        self.drink = Drink(title='Water', recipe=[WATER])
+        self.drink.insert()
+
+    def tearDown(self):
+        db.session.remove()
+        self.context.pop()
+
+    def reloaded(self, drink):
+        id = drink.id
+        db.session.remove()
+        return Drink.query.get(id)
+
+    def test_recipe_round_trip(self):
+        for recipe in ([WATER, MILK], json.dumps([WATER, MILK])):
+            drink = Drink(title='Drink {}'.format(type(recipe).__name__), recipe=recipe)
+            drink.insert()
+            self.assertEqual(self.reloaded(drink).recipe, [WATER, MILK])
+
+    def test_single_ingredient_becomes_a_list(self):
+        drink = Drink(title='Milk', recipe=MILK)
+        drink.insert()
+
+        self.assertEqual(self.reloaded(drink).recipe, [MILK])
+
+    def test_assigning_recipe_resets_projections(self):
+        self.drink.long()
+        self.drink.recipe = [MILK]
+
+        self.assertEqual(self.drink.long()['recipe'], [MILK])
+        self.assertEqual(self.drink.short()['recipe'], [{'color': 'white', 'parts': 2}])
+
+    def test_assigning_title_resets_projections(self):
+        self.drink.short()
+        self.drink.title = 'Still Water'
+
+        self.assertEqual(self.drink.short()['title'], 'Still Water')
+        self.assertEqual(self.drink.long()['title'], 'Still Water')
+
+    def test_refresh_resets_projections(self):
+        self.drink.long()
+        db.session.execute(Drink.__table__.update().values(title='Tap Water'))
+        db.session.refresh(self.drink)
+
+        self.assertEqual(self.drink.long()['title'], 'Tap Water')
+
+    def test_changing_recipe_in_place_resets_projections(self):
+        self.drink.long()
+        self.drink.recipe.append(MILK)
+
+        self.assertEqual(self.drink.long()['recipe'], [WATER, MILK])
+        self.assertEqual(len(self.drink.short()['recipe']), 2)
+        self.drink.update()
+        self.assertEqual(self.reloaded(self.drink).recipe, [WATER, MILK])
+
+    def test_changing_a_projection_leaves_the_cache_intact(self):
+        short, long = self.drink.short(), self.drink.long()
+        short['title'] = 'Changed'
+        short['recipe'][0]['color'] = 'red'
+        long['recipe'].append(MILK)
+
+        self.assertEqual(self.drink.short(), {
+            'id': self.drink.id, 'title': 'Water',
+            'recipe': [{'color': 'blue', 'parts': 1}]})
+        self.assertEqual(self.drink.long()['recipe'], [WATER])
+
+
+class SetupDbTestCase(unittest.TestCase):
+    """This class represents the sqlite profile test case"""
+
+    def test_in_memory_database_keeps_its_tables(self):
+        app = Flask(__name__)
+        setup_db(app, 'sqlite://')
+        with app.app_context():
+            db.create_all()
+            Drink(title='Water', recipe=[WATER]).insert()
+            # a second connection, as a concurrent request would check out
+            with db.engine.connect() as first, db.engine.connect() as second:
+                for connection in (first, second):
+                    self.assertEqual(connection.execute(
+                        Drink.__table__.select()).fetchone().title, 'Water')
+            db.session.remove()
+
+        self.assertNotIn('poolclass', app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+
+    def test_sqlite_file_gets_the_profile(self):
+        if sqlite_file(TEST_DATABASE_URL) is None:
+            self.skipTest('TEST_DATABASE_URL is not a SQLite file')
+        app = Flask(__name__)
+        setup_db(app, TEST_DATABASE_URL)
+        with app.app_context():
+            self.assertIsInstance(db.engine.pool, QueuePool)
+            with db.engine.connect() as connection:
+                self.assertEqual(connection.execute(
+                    'PRAGMA journal_mode').scalar(), 'wal')
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+# src.api binds its database when imported; keep the tests off database.db
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL', 'sqlite:///{}'.format(
+    os.path.join(tempfile.gettempdir(), 'coffee_shop_test.db')))
+os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+
+from .api import app, menu_cache
+from .database.models import db, db_drop_and_create_all, Drink
+
+
+class DrinksMenuTestCase(unittest.TestCase):
+    """This class represents the cached GET /drinks test case"""
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        db_drop_and_create_all()
+        self.drink = Drink(title='Water', recipe=[
+            {'name': 'water', 'color': 'blue', 'parts': 1}])
+        self.drink.insert()
+        menu_cache.clear()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        self.context.pop()
+
+    def etag(self):
+        response = self.client.get('/drinks')
+        self.assertEqual(response.status_code, 200)
+        return response.headers['ETag']
+
+    def assertETagChangedBy(self, write):
+        etag = self.etag()
+        write()
+        self.assertNotEqual(self.etag(), etag)
+        response = self.client.get('/drinks', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_drinks_not_modified(self):
+        etag = self.etag()
+        response = self.client.get('/drinks', headers={'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    # the POST, PATCH and DELETE /drinks routes are left to implement;
+    # they write through Drink.insert(), update() and delete()
+    def test_etag_changes_after_insert(self):
+        self.assertETagChangedBy(lambda: Drink(title='Milk', recipe=[
+            {'name': 'milk', 'color': 'white', 'parts': 1}]).insert())
+
+    def test_etag_changes_after_update(self):
+        def rename():
+            self.drink.title = 'Sparkling Water'
+            self.drink.update()
+        self.assertETagChangedBy(rename)
+
+    def test_etag_changes_after_delete(self):
+        self.assertETagChangedBy(self.drink.delete)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
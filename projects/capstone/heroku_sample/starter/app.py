@@ -1,12 +1,15 @@
 import os
 from flask import Flask
+from flask_cors import CORS
 from models import setup_db
+from startup import startup_profile
 
 def create_app(test_config=None):
 
     app = Flask(__name__)
     setup_db(app)
     CORS(app)
+    app.cli.add_command(startup_profile)
 
     @app.route('/')
     def get_greeting():
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, create_engine
+import os
+from sqlalchemy import Column, String, Integer, create_engine
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -6,16 +7,39 @@ database_path = os.environ['DATABASE_URL']
 
 db = SQLAlchemy()
 
+'''
+schema_setup()
+    how setup_db() puts the tables in place, read from SCHEMA_SETUP:
+    'create'      db.create_all() inside setup_db(), the default: this
+                  sample ships no migrations, so on a fresh Heroku
+                  Postgres the People table only exists if the app
+                  creates it
+    'lazy'        db.create_all() before the first request instead; every
+                  dyno still runs it once
+    'migrations'  never; set this once the schema is managed elsewhere
+'''
+SCHEMA_SETUPS = ('create', 'lazy', 'migrations')
+
+def schema_setup():
+    return os.environ.get('SCHEMA_SETUP', 'create')
+
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
 '''
-def setup_db(app, database_path=database_path):
+def setup_db(app, database_path=database_path, schema=None):
+    schema = schema or schema_setup()
+    if schema not in SCHEMA_SETUPS:
+        raise ValueError('SCHEMA_SETUP must be one of {}, not {!r}'.format(
+            ', '.join(SCHEMA_SETUPS), schema))
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     db.app = app
     db.init_app(app)
-    db.create_all()
+    if schema == 'create':
+        db.create_all()
+    elif schema == 'lazy':
+        app.before_first_request(db.create_all)
 
 
 '''
@@ -0,0 +1,60 @@
+import json
+import os
+import subprocess
+import sys
+
+import click
+
+# importing app builds it (app = create_app() at module level), so a cold
+# interpreter times imports, setup_db() and the first request; the per-module
+# `-X importtime` report goes to stderr
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+created = time.perf_counter()
+response = app.app.test_client().get(sys.argv[1])
+response.get_data()
+served = time.perf_counter()
+print(json.dumps({
+    'create': created - start,
+    'first_request': served - created,
+    'status': response.status_code,
+}))
+'''
+
+
+def profile_startup(path='/coolkids'):
+    """ ({'create', 'first_request', 'status'}, [(module, cumulative s)])
+    for a cold start of this app """
+    here = os.path.dirname(os.path.abspath(__file__))
+    probe = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE, path],
+        cwd=here, env=dict(os.environ, PYTHONPATH=here),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    if probe.returncode:
+        raise click.ClickException(probe.stderr.splitlines()[-1])
+    modules = []
+    for line in probe.stderr.splitlines():
+        if line.startswith('import time:') and 'self [us]' not in line:
+            _, cumulative, module = line[len('import time:'):].split('|')
+            modules.append((module.strip(), int(cumulative) / 1e6))
+    return json.loads(probe.stdout.splitlines()[-1]), modules
+
+
+@click.command('startup-profile')
+@click.option('--path', default='/coolkids', show_default=True,
+              help='URL fetched as the first request.')
+@click.option('--top', default=10, show_default=True,
+              help='Number of slowest imports to list.')
+def startup_profile(path, top):
+    """ Time a cold start: import and create_app(), then the first request. """
+    timings, modules = profile_startup(path)
+    click.echo('import + create_app()  {:8.1f} ms'.format(timings['create'] * 1e3))
+    click.echo('first request          {:8.1f} ms  (GET {} -> {})'.format(
+        timings['first_request'] * 1e3, path, timings['status']))
+    click.echo('\nslowest imports (cumulative ms)')
+    for module, cumulative in sorted(
+            modules, key=lambda module: module[1], reverse=True)[:top]:
+        click.echo('  {:<40} {:8.1f}'.format(module, cumulative * 1e3))
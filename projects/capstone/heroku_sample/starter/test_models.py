@@ -0,0 +1,58 @@
+import os
+import unittest
+from unittest import mock
+
+# models reads DATABASE_URL on import; every test binds its own database
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from flask import Flask
+
+from models import db, setup_db, Person
+
+
+class SchemaSetupTestCase(unittest.TestCase):
+    """This class represents the SCHEMA_SETUP modes test case"""
+
+    def app(self, schema=None):
+        app = Flask(__name__)
+        setup_db(app, 'sqlite://', schema)
+
+        @app.route('/')
+        def index():
+            return 'ok'
+
+        return app
+
+    def has_people_table(self, app):
+        with app.app_context():
+            return db.engine.has_table(Person.__tablename__)
+
+    def test_create_is_the_default(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('SCHEMA_SETUP', None)
+            app = self.app()
+
+        self.assertTrue(self.has_people_table(app))
+
+    def test_lazy_creates_on_first_request(self):
+        app = self.app('lazy')
+        self.assertFalse(self.has_people_table(app))
+
+        app.test_client().get('/')
+
+        self.assertTrue(self.has_people_table(app))
+
+    def test_migrations_leaves_the_schema_alone(self):
+        app = self.app('migrations')
+        app.test_client().get('/')
+
+        self.assertFalse(self.has_people_table(app))
+
+    def test_unknown_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.app('sometimes')
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
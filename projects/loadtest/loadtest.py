@@ -0,0 +1,386 @@
+'''
+Load tests for the Fyyur, trivia and coffee shop backends.
+
+    python loadtest.py run [--app fyyur] [--clients 8] [--seconds 10] [--scale 1]
+    python loadtest.py compare results/before.json results/after.json
+
+Each app is seeded with a scale dataset and served by a threaded local
+server in its own process. Every route is then driven by --clients
+concurrent keep-alive clients for --seconds, after a short warm-up, and
+its requests per second and p50/p95/p99 latencies are written to a JSON
+file named after the date and the git commit.
+
+Databases are throwaway SQLite files unless --database-url is given (with
+a single --app); an empty database is seeded, a seeded one is reused.
+'''
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECTS = os.path.dirname(HERE)
+RESULTS = os.path.join(HERE, 'results')
+
+# request(rng, dataset) -> (method, path, body, headers)
+Route = namedtuple('Route', 'name request')
+App = namedtuple('App', 'directory setup routes')
+
+ADJECTIVES = ['Wild', 'Blue', 'Electric', 'Velvet', 'Golden', 'Silent',
+              'Crimson', 'Lucky', 'Midnight', 'Neon', 'Rusty', 'Hollow']
+NOUNS = ['Sax', 'Petals', 'Hop', 'Owls', 'Lanterns', 'Tides', 'Foxes',
+         'Bells', 'Engines', 'Harbor', 'Cellar', 'Garden']
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+          ('Chicago', 'IL'), ('Seattle', 'WA'), ('Nashville', 'TN'),
+          ('Denver', 'CO'), ('Portland', 'OR'), ('Boston', 'MA'),
+          ('New Orleans', 'LA')]
+
+
+def band_name(rng, i):
+    return 'The {} {} {}'.format(rng.choice(ADJECTIVES), rng.choice(NOUNS), i)
+
+
+def form(path, fields):
+    return ('POST', path, urlencode(fields),
+            {'Content-Type': 'application/x-www-form-urlencoded'})
+
+
+def json_post(path, body):
+    return ('POST', path, json.dumps(body),
+            {'Content-Type': 'application/json'})
+
+
+# Fyyur ----------------------------------------------------------------------
+
+def setup_fyyur(database_url, scale):
+    os.environ['DATABASE_URL'] = database_url
+    from app import app
+    from models import (db, Venue, Artist, Show, refresh_upcoming_show_counts,
+                        refresh_artist_letters)
+
+    sizes = {'venues': 1000 * scale, 'artists': 1000 * scale,
+             'shows': 20000 * scale}
+    with app.app_context():
+        db.create_all()
+        if not db.session.query(Venue.id).first():
+            rng = random.Random(0)
+            now = datetime.utcnow().replace(microsecond=0)
+            with db.engine.begin() as connection:
+                for model, size in ((Venue, sizes['venues']),
+                                    (Artist, sizes['artists'])):
+                    rows = []
+                    for i in range(size):
+                        city, state = rng.choice(CITIES)
+                        rows.append({'name': band_name(rng, i), 'city': city,
+                                     'state': state})
+                    connection.execute(model.__table__.insert(), rows)
+                connection.execute(Show.__table__.insert(), [{
+                    'venue_id': rng.randint(1, sizes['venues']),
+                    'artist_id': rng.randint(1, sizes['artists']),
+                    # a year either side of now: about half are upcoming
+                    'start_time': now + timedelta(
+                        hours=rng.randint(-365 * 24, 365 * 24)),
+                } for _ in range(sizes['shows'])])
+                refresh_upcoming_show_counts(connection)
+                refresh_artist_letters(connection)
+        sizes = {'venues': Venue.query.count(), 'artists': Artist.query.count(),
+                 'shows': Show.query.count()}
+    return app, sizes
+
+
+FYYUR_ROUTES = [
+    Route('GET /venues', lambda rng, dataset: ('GET', '/venues', None, {})),
+    Route('POST /artists/search', lambda rng, dataset: form(
+        '/artists/search', {'search_term': rng.choice(ADJECTIVES + NOUNS)})),
+    # band names start with "The", so jumps mostly land deep in the directory
+    Route('GET /artists?letter=', lambda rng, dataset: (
+        'GET', '/artists?letter={}'.format(rng.choice('ABCMTUZ')), None, {})),
+]
+
+
+# Trivia ---------------------------------------------------------------------
+
+def setup_trivia(database_url, scale):
+    from flaskr import create_app
+    from flaskr.seed import seed_database
+    from models import db, Question, Category
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url,
+                      'SCHEMA_SETUP': 'create'})
+    with app.app_context():
+        if not db.session.query(Question.id).first():
+            with db.engine.begin() as connection:
+                seed_database(connection, questions=100000 * scale)
+        categories = [category.id for category in Category.query.all()]
+        sizes = {'questions': Question.query.count(),
+                 'categories': len(categories)}
+        db.session.remove()
+    return app, dict(sizes, category_ids=categories)
+
+
+def quiz(rng, dataset):
+    # a quiz a few rounds in, for one category or for all of them
+    return json_post('/quizzes', {
+        'previous_questions': rng.sample(
+            range(1, dataset['questions'] + 1), min(5, dataset['questions'])),
+        'quiz_category': {'id': rng.choice([0] + dataset['category_ids'])},
+    })
+
+
+TRIVIA_ROUTES = [
+    # most browsing happens on the first pages
+    Route('GET /questions', lambda rng, dataset: (
+        'GET', '/questions?page={}'.format(
+            rng.randint(1, min(100, max(1, dataset['questions'] // 10)))),
+        None, {})),
+    Route('POST /quizzes', quiz),
+]
+
+
+# Coffee shop ----------------------------------------------------------------
+
+def setup_coffee(database_url, scale):
+    os.environ['DATABASE_URL'] = database_url
+    from src.api import app
+    from src.database.models import db, Drink
+    from benchmarks import load_drinks
+
+    with app.app_context():
+        db.create_all()
+        if not db.session.query(Drink.id).first():
+            load_drinks(1000 * scale)
+        sizes = {'drinks': Drink.query.count()}
+        db.session.remove()
+    return app, sizes
+
+
+COFFEE_ROUTES = [
+    Route('GET /drinks', lambda rng, dataset: ('GET', '/drinks', None, {})),
+]
+
+
+APPS = {
+    'fyyur': App('01_fyyur/starter_code', setup_fyyur, FYYUR_ROUTES),
+    'trivia': App('02_trivia_api/starter/backend', setup_trivia, TRIVIA_ROUTES),
+    'coffee': App('03_coffee_shop_full_stack/starter_code/backend',
+                  setup_coffee, COFFEE_ROUTES),
+}
+
+
+# Server process -------------------------------------------------------------
+
+def serve(name, database_url, scale):
+    ''' Seed and serve one app; the port and dataset go to stdout as json '''
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    directory = os.path.join(PROJECTS, APPS[name].directory)
+    os.chdir(directory)
+    sys.path.insert(0, directory)
+    app, dataset = APPS[name].setup(database_url, scale)
+    server = make_server('127.0.0.1', 0, app, threaded=True,
+                         request_handler=QuietHandler)
+    print(json.dumps({'port': server.server_port, 'dataset': dataset}), flush=True)
+    server.serve_forever()
+
+
+def start_server(name, database_url, scale):
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), 'serve', name,
+         '--database-url', database_url, '--scale', str(scale)],
+        stdout=subprocess.PIPE, universal_newlines=True)
+    # skip anything the app prints while importing and seeding
+    for line in server.stdout:
+        if line.startswith('{"port"'):
+            break
+    else:
+        server.wait()
+        raise SystemExit('{} server exited with status {}'.format(
+            name, server.returncode))
+    started = json.loads(line)
+    return server, started['port'], started['dataset']
+
+
+# Clients --------------------------------------------------------------------
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0
+
+
+def drive(port, route, dataset, seed, stop, latencies, errors):
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    while not stop.is_set():
+        method, path, body, headers = route.request(rng, dataset)
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            response.read()
+            failed = response.status >= 400
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            failed = True
+        elapsed = time.perf_counter() - start
+        if not stop.is_set():
+            latencies.append(elapsed)
+            if failed:
+                errors.append(elapsed)
+    connection.close()
+
+
+def load(port, route, dataset, clients, seconds, warmup):
+    ''' Drive `route` with `clients` threads; returns its stats '''
+    for phase, duration in (('warmup', warmup), ('measure', seconds)):
+        stop = threading.Event()
+        latencies, errors = [], []
+        threads = [threading.Thread(
+            target=drive,
+            args=(port, route, dataset, client, stop, latencies, errors))
+            for client in range(clients)]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / seconds,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': max(latencies, default=0) * 1000,
+    }
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=HERE,
+            universal_newlines=True).strip()
+        dirty = subprocess.check_output(
+            ['git', 'status', '--porcelain', '--', PROJECTS], cwd=HERE,
+            universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def run(args):
+    results = {
+        'commit': git_commit(),
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {'clients': args.clients, 'seconds': args.seconds,
+                     'warmup': args.warmup, 'scale': args.scale},
+        'apps': {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.app:
+            database_url = args.database_url or 'sqlite:///{}'.format(
+                os.path.join(directory, name + '.db'))
+            print('{}: seeding and starting the server...'.format(name), flush=True)
+            server, port, dataset = start_server(name, database_url, args.scale)
+            try:
+                routes = {}
+                for route in APPS[name].routes:
+                    routes[route.name] = stats = load(
+                        port, route, dataset, args.clients, args.seconds,
+                        args.warmup)
+                    print('  {:<22} {rps:8.1f} req/s  p50 {p50_ms:7.1f}ms'
+                          '  p95 {p95_ms:7.1f}ms  p99 {p99_ms:7.1f}ms'
+                          '  errors {errors}'.format(route.name, **stats),
+                          flush=True)
+            finally:
+                server.terminate()
+                server.wait()
+            dataset.pop('category_ids', None)
+            results['apps'][name] = {'dataset': dataset, 'routes': routes}
+
+    output = args.output or os.path.join(RESULTS, '{}-{}.json'.format(
+        datetime.now().strftime('%Y%m%d-%H%M%S'), results['commit'][:8]))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+    print('results written to {}'.format(output))
+
+
+def compare(args):
+    with open(args.before) as file:
+        before = json.load(file)
+    with open(args.after) as file:
+        after = json.load(file)
+    print('{} -> {}'.format(before['commit'][:12], after['commit'][:12]))
+    for name, app in sorted(after['apps'].items()):
+        for route, stats in sorted(app['routes'].items()):
+            old = before['apps'].get(name, {}).get('routes', {}).get(route)
+            if old is None:
+                print('  {:<8} {:<22} (new)'.format(name, route))
+                continue
+            print('  {:<8} {:<22} {:8.1f} -> {:8.1f} req/s ({:+6.1%})'
+                  '  p95 {:7.1f} -> {:7.1f}ms  p99 {:7.1f} -> {:7.1f}ms'.format(
+                      name, route, old['rps'], stats['rps'],
+                      stats['rps'] / old['rps'] - 1 if old['rps'] else 0,
+                      old['p95_ms'], stats['p95_ms'],
+                      old['p99_ms'], stats['p99_ms']))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    run_parser = commands.add_parser('run', help='load test the apps')
+    run_parser.add_argument('--app', action='append', choices=sorted(APPS),
+                            help='app to test, repeatable (default: all)')
+    run_parser.add_argument('--clients', type=int, default=8)
+    run_parser.add_argument('--seconds', type=float, default=10)
+    run_parser.add_argument('--warmup', type=float, default=2)
+    run_parser.add_argument('--scale', type=int, default=1,
+                            help='dataset size multiplier')
+    run_parser.add_argument('--database-url',
+                            help='database for a single --app')
+    run_parser.add_argument('--output', help='results file')
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser(
+        'compare', help='compare two results files')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.set_defaults(handler=compare)
+
+    serve_parser = commands.add_parser('serve', help=argparse.SUPPRESS)
+    serve_parser.add_argument('app', choices=sorted(APPS))
+    serve_parser.add_argument('--database-url', required=True)
+    serve_parser.add_argument('--scale', type=int, default=1)
+    serve_parser.set_defaults(
+        handler=lambda args: serve(args.app, args.database_url, args.scale))
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        args.app = args.app or sorted(APPS)
+        if args.database_url and len(args.app) > 1:
+            parser.error('--database-url needs exactly one --app')
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()